@@ -0,0 +1,72 @@
+import sys
+import json
+import subprocess
+import statistics
+import click
+
+# Entry points run by cron and the modules they must not import
+ENTRY_POINTS = {
+    'sprucepy': [],
+    'sprucepy.dispatch': ['requests', 'click'],
+    'sprucepy.api': [],
+}
+
+HEAVY_MODULES = [
+    'boto3',
+    'psutil',
+    'crontab',
+    'croniter',
+    'pretty_cron',
+    'pytz',
+]
+
+
+def measure(module, python=sys.executable):
+    """Imports a module in a fresh interpreter
+
+    Returns:
+        tuple: (cumulative import time in ms, list of loaded heavy modules)
+    """
+
+    forbidden = HEAVY_MODULES + ENTRY_POINTS.get(module, [])
+
+    code = (
+        'import sys, json, time\n'
+        't = time.perf_counter()\n'
+        f'import {module}\n'
+        't = time.perf_counter() - t\n'
+        f'print(json.dumps([t * 1000, [m for m in {forbidden!r} if m in sys.modules]]))\n'
+    )
+
+    res = subprocess.run([python, '-c', code], stdout=subprocess.PIPE, check=True)
+
+    return json.loads(res.stdout)
+
+
+@click.command()
+@click.option('--repeat', default=5, type=int)
+@click.option('--max_ms', default=None, type=float)
+def main(repeat, max_ms):
+    """Import-time regression check for the sprucepy entry points
+
+    REPEAT is the number of fresh interpreters per entry point
+    MAX_MS fails the check if any median import time exceeds it
+    """
+
+    failed = False
+
+    for module in ENTRY_POINTS:
+        runs = [measure(module) for _ in range(repeat)]
+        median = statistics.median(r[0] for r in runs)
+        loaded = runs[0][1]
+
+        print(f'{module:<20} {median:8.1f} ms  {"loads " + ", ".join(loaded) if loaded else ""}')
+
+        if loaded or (max_ms is not None and median > max_ms):
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
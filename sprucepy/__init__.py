@@ -1,5 +1,27 @@
-from . import linscheduler
-from . import scheduler
-from . import runner
-from . import notifier
+import importlib
+
 name = "sprucepy"
+
+# Submodules are imported on first attribute access so that entry points
+# like sprucepy.dispatch and sprucepy.api don't pay for the heavy
+# dependencies of the scheduler and runner
+_submodules = [
+    'linscheduler',
+    'scheduler',
+    'runner',
+    'notifier',
+]
+
+
+def __getattr__(attr):
+    if attr in _submodules:
+        module = importlib.import_module(f'.{attr}', __name__)
+        globals()[attr] = module
+
+        return module
+
+    raise AttributeError(f'module {__name__!r} has no attribute {attr!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
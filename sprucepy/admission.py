@@ -0,0 +1,170 @@
+import os
+import re
+import time
+import fcntl
+from .constants import cache_dir
+
+MAX_RUNS = int(os.getenv('SPRUCE_MAX_RUNS', os.cpu_count() or 1))
+DEFAULT_PRIORITY = 50
+POLL = 0.5
+
+# rank-arrival-pid
+TICKET_PAT = re.compile(r'^\d{3}-\d{20}-\d+$')
+
+
+class Slot:
+    def __init__(self, lock_file, index, queued_seconds):
+        """A held run slot; released on release() or process exit
+
+        Args:
+            lock_file (file): the open, flocked slot file
+            index (int): which slot is held
+            queued_seconds (float): time spent waiting for the slot
+        """
+        self.lock_file = lock_file
+        self.index = index
+        self.queued_seconds = queued_seconds
+
+    def release(self):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class SlotPool:
+    def __init__(self, slots=MAX_RUNS, directory=None, poll=POLL):
+        """Host-wide pool of run slots shared by every sprucepy process
+
+        Each slot is a file held with flock, so a slot frees itself when
+        its process exits. Waiters queue as ticket files ordered by
+        priority and then arrival, and only the head of the queue may
+        take a free slot. Tickets are flocked by their waiter too, so a
+        ticket left by a killed process is recognized and cleared.
+
+        Args:
+            slots (int, optional): number of runs allowed at once
+            directory (str, optional): directory for slot and ticket files
+            poll (float, optional): seconds between attempts while queued
+        """
+        self.slots = slots
+        self.directory = directory or os.path.join(cache_dir, 'slots')
+        self.queue_dir = os.path.join(self.directory, 'queue')
+        self.poll = poll
+
+        os.makedirs(self.queue_dir, exist_ok=True)
+
+    def _ticket(self, priority):
+        """Queues a ticket, flocked for as long as its file is open
+
+        Returns:
+            tuple: the ticket name and its open file
+        """
+
+        # Higher priority sorts first, then first come first served
+        rank = 999 - max(0, min(999, int(priority)))
+        name = f'{rank:03d}-{time.time_ns():020d}-{os.getpid()}'
+
+        # Locked under a hidden name first so no one sees it unlocked
+        tmp = os.path.join(self.queue_dir, f'.{name}')
+        ticket_file = open(tmp, 'w')
+        fcntl.flock(ticket_file, fcntl.LOCK_EX)
+        os.rename(tmp, os.path.join(self.queue_dir, name))
+
+        return name, ticket_file
+
+    def _alive(self, name):
+        path = os.path.join(self.queue_dir, name)
+
+        try:
+            ticket_file = open(path, 'a')
+        except FileNotFoundError:
+            return False
+
+        with ticket_file:
+            try:
+                fcntl.flock(ticket_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+
+            # Nobody holds it, so its waiter is gone
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return False
+
+    def _head(self, own=None):
+        """Returns the first live ticket, clearing those of dead processes
+        """
+
+        for name in sorted(os.listdir(self.queue_dir)):
+            if not TICKET_PAT.match(name):
+                continue
+
+            if name == own or self._alive(name):
+                return name
+
+        return None
+
+    def _try_slot(self):
+        for i in range(self.slots):
+            lock_file = open(os.path.join(self.directory, f'slot_{i}'), 'a')
+
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+
+            return i, lock_file
+
+        return None
+
+    def queue_length(self):
+        return sum(1 for name in os.listdir(self.queue_dir) if TICKET_PAT.match(name))
+
+    def acquire(self, priority=DEFAULT_PRIORITY, timeout=None):
+        """Waits in the queue until a slot is free
+
+        Args:
+            priority (int, optional): 0-999, higher is admitted first
+            timeout (float, optional): max seconds to wait
+
+        Returns:
+            Slot: the held slot
+
+        Raises:
+            TimeoutError: if no slot was free within timeout
+        """
+
+        start = time.monotonic()
+        ticket, ticket_file = self._ticket(priority)
+
+        try:
+            while True:
+                if self._head(own=ticket) == ticket:
+                    held = self._try_slot()
+
+                    if held is not None:
+                        return Slot(held[1], held[0], time.monotonic() - start)
+
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise TimeoutError('No run slot free after {}s'.format(timeout))
+
+                time.sleep(self.poll)
+        finally:
+            # Removed before unlocking, so no one clears it as dead first
+            try:
+                os.remove(os.path.join(self.queue_dir, ticket))
+            except FileNotFoundError:
+                pass
+
+            ticket_file.close()
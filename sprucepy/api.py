@@ -1,4 +1,4 @@
-import requests
+from . import client
 import click
 
 spruce_api = 'http://localhost:1592/api/v1/'
@@ -6,7 +6,7 @@ execute_ept = 'tasks/execute/{}'
 
 
 def run_from_api(task_id):
-    return requests.get(spruce_api + execute_ept.format(task_id))
+    return client.get(spruce_api + execute_ept.format(task_id))
 
 
 @click.command()
@@ -0,0 +1,138 @@
+import os
+import threading
+from collections import deque
+
+DEFAULT_BUFFER_BYTES = 256 * 1024
+CHUNK_SIZE = 8192
+
+
+class RingBuffer:
+    """Keeps the most recent `max_bytes` written to it
+
+    Older data is dropped from the front once the limit is reached, so
+    memory use stays flat no matter how much is written.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUFFER_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.total = 0
+        self._chunks = deque()
+        self._lock = threading.Lock()
+
+    def write(self, chunk):
+        with self._lock:
+            self._chunks.append(chunk)
+            self.size += len(chunk)
+            self.total += len(chunk)
+
+            while self.size > self.max_bytes:
+                head = self._chunks.popleft()
+                overflow = self.size - self.max_bytes
+
+                if overflow < len(head):
+                    # Only part of the head chunk needs to go
+                    self._chunks.appendleft(head[overflow:])
+                    self.size -= overflow
+                else:
+                    self.size -= len(head)
+
+    @property
+    def truncated(self):
+        return self.total > self.size
+
+    def getvalue(self):
+        with self._lock:
+            return b''.join(self._chunks)
+
+    def text(self, encoding='utf-8'):
+        return self.getvalue().decode(encoding, errors='replace')
+
+
+class StreamCapture:
+    def __init__(
+        self,
+        name,
+        stream,
+        max_bytes=DEFAULT_BUFFER_BYTES,
+        spool_path=None
+    ):
+        """Drains a pipe on a background thread
+
+        Args:
+            name (str): label for the stream (e.g. 'stdout')
+            stream (file): the readable end of the pipe
+            max_bytes (int, optional): size of the in-memory tail buffer
+            spool_path (str, optional): file to receive the complete output
+        """
+        self.name = name
+        self.stream = stream
+        self.buffer = RingBuffer(max_bytes)
+        self.spool_path = spool_path
+        self._thread = None
+
+    def _drain(self):
+        spool = open(self.spool_path, 'wb') if self.spool_path else None
+
+        try:
+            read = getattr(self.stream, 'read1', self.stream.read)
+
+            for chunk in iter(lambda: read(CHUNK_SIZE), b''):
+                self.buffer.write(chunk)
+
+                if spool is not None:
+                    spool.write(chunk)
+        finally:
+            if spool is not None:
+                spool.close()
+
+            self.stream.close()
+
+    def start(self):
+        self._thread = threading.Thread(
+            name='capture_{}'.format(self.name),
+            target=self._drain,
+            daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def tail(self):
+        return self.buffer.text()
+
+
+def capture_process(
+    proc,
+    max_bytes=DEFAULT_BUFFER_BYTES,
+    spool_dir=None,
+    prefix='run'
+):
+    """Starts draining stdout and stderr of a Popen object concurrently
+
+    Args:
+        proc (Popen): process started with stdout=PIPE and stderr=PIPE
+        max_bytes (int, optional): tail buffer size per stream
+        spool_dir (str, optional): directory for full output spool files
+        prefix (str, optional): file name prefix for the spool files
+
+    Returns:
+        tuple: (stdout StreamCapture, stderr StreamCapture)
+    """
+
+    captures = []
+    for name, stream in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+        spool_path = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            spool_path = os.path.join(spool_dir, f'{prefix}.{name}.log')
+
+        captures.append(
+            StreamCapture(name, stream, max_bytes, spool_path).start()
+        )
+
+    return tuple(captures)
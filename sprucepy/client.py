@@ -0,0 +1,112 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = int(os.getenv('SPRUCE_HTTP_POOL_SIZE', 10))
+DEFAULT_TIMEOUT = float(os.getenv('SPRUCE_HTTP_TIMEOUT', 30))
+DEFAULT_RETRIES = int(os.getenv('SPRUCE_HTTP_RETRIES', 3))
+DEFAULT_BACKOFF = float(os.getenv('SPRUCE_HTTP_BACKOFF', 0.5))
+
+_settings = dict(
+    pool_size=DEFAULT_POOL_SIZE,
+    timeout=DEFAULT_TIMEOUT,
+    retries=DEFAULT_RETRIES,
+    backoff=DEFAULT_BACKOFF,
+)
+
+_session = None
+_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=_settings['retries'],
+        connect=_settings['retries'],
+        # Never resend a request the server may already have acted on
+        read=0,
+        backoff_factor=_settings['backoff'],
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    )
+
+    adapter = HTTPAdapter(
+        pool_connections=_settings['pool_size'],
+        pool_maxsize=_settings['pool_size'],
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def configure(pool_size=None, timeout=None, retries=None, backoff=None):
+    """Changes the shared client settings and resets the session
+
+    Args:
+        pool_size (int, optional): max keep-alive connections per host
+        timeout (float, optional): default request timeout in seconds
+        retries (int, optional): retries on connection errors and 5xx
+        backoff (float, optional): backoff factor between retries
+    """
+
+    global _session
+
+    updates = dict(
+        pool_size=pool_size,
+        timeout=timeout,
+        retries=retries,
+        backoff=backoff,
+    )
+
+    with _lock:
+        _settings.update({k: v for k, v in updates.items() if v is not None})
+
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_session():
+    """Returns the process-wide pooled session, creating it on first use
+    """
+
+    global _session
+
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+
+    return _session
+
+
+def close():
+    global _session
+
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault('timeout', _settings['timeout'])
+
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
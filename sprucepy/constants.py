@@ -1,8 +1,55 @@
+import os
 
 api_url = 'http://localhost:1592/api/v1/'
 app_url = 'http://localhost:1592/'
 
+cache_dir = os.getenv(
+    'SPRUCE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'sprucepy')
+)
+
+worker_socket = os.getenv(
+    'SPRUCE_WORKER_SOCKET',
+    os.path.join(cache_dir, 'worker.sock')
+)
+
 ineligible_packages = [
     'sprucepy',
     'wpconnect'
 ]
+
+# Import names that differ from the distribution to install from PyPI
+package_aliases = {
+    'attr': 'attrs',
+    'bs4': 'beautifulsoup4',
+    'crontab': 'python-crontab',
+    'Crypto': 'pycryptodome',
+    'cv2': 'opencv-python',
+    'dateutil': 'python-dateutil',
+    'docx': 'python-docx',
+    'dotenv': 'python-dotenv',
+    'fitz': 'PyMuPDF',
+    'git': 'GitPython',
+    'github': 'PyGithub',
+    'jose': 'python-jose',
+    'jwt': 'PyJWT',
+    'ldap': 'python-ldap',
+    'Levenshtein': 'python-Levenshtein',
+    'magic': 'python-magic',
+    'multipart': 'python-multipart',
+    'MySQLdb': 'mysqlclient',
+    'OpenSSL': 'pyOpenSSL',
+    'PIL': 'Pillow',
+    'pptx': 'python-pptx',
+    'psycopg2': 'psycopg2-binary',
+    'serial': 'pyserial',
+    'skimage': 'scikit-image',
+    'sklearn': 'scikit-learn',
+    'slugify': 'python-slugify',
+    'usb': 'pyusb',
+    'win32api': 'pywin32',
+    'win32com': 'pywin32',
+    'xlsxwriter': 'XlsxWriter',
+    'yaml': 'PyYAML',
+    'zmq': 'pyzmq',
+}
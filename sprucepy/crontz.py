@@ -0,0 +1,217 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+import pytz
+
+# Translated expressions kept in memory
+CACHE_SIZE = 4096
+
+FIELD_RANGES = [
+    (0, 59),  # minute
+    (0, 23),  # hour
+    (1, 31),  # day of month
+    (1, 12),  # month
+    (0, 6),   # day of week
+]
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """Returns a cached pytz zone by name
+    """
+
+    return pytz.timezone(name)
+
+
+def offset_minutes(from_tz, to_tz, at=None):
+    """Minutes to add to a wall-clock time in from_tz to get the same
+    instant in to_tz, using the offsets in effect at `at` (default now)
+
+    Args:
+        from_tz (str): zone name of the source times
+        to_tz (str): zone name of the target times
+        at (datetime, optional): instant whose offsets are used
+    """
+
+    if at is None:
+        at = datetime.now(timezone.utc)
+    elif at.tzinfo is None:
+        at = get_zone(from_tz).localize(at)
+
+    delta = at.astimezone(get_zone(to_tz)).utcoffset() - at.astimezone(get_zone(from_tz)).utcoffset()
+
+    return int(delta.total_seconds() // 60)
+
+
+def parse_field(field, lo, hi):
+    """Expands a numeric cron field into the sorted values it matches
+
+    Returns:
+        list: the values, or None if the field uses names or other syntax
+    """
+
+    values = set()
+
+    for part in field.split(','):
+        rng, _, step = part.partition('/')
+
+        if not step:
+            step = 1
+        elif not step.isdigit() or int(step) == 0:
+            return None
+
+        if rng == '*':
+            start, end = lo, hi
+        elif '-' in rng:
+            start, _, end = rng.partition('-')
+
+            if not (start.isdigit() and end.isdigit()):
+                return None
+        elif rng.isdigit():
+            start = rng
+            end = hi if part != rng else rng
+        else:
+            return None
+
+        start, end = int(start), int(end)
+
+        if start < lo or end > hi or start > end:
+            return None
+
+        values.update(range(start, end + 1, int(step)))
+
+    return sorted(values)
+
+
+def render_field(values, lo, hi):
+    """Renders values as a compact cron field
+    """
+
+    values = sorted(values)
+
+    if values == list(range(lo, hi + 1)):
+        return '*'
+
+    if len(values) > 2:
+        step = values[1] - values[0]
+        progression = list(range(values[0], values[-1] + 1, step))
+
+        if step > 1 and values == progression:
+            if values[0] == lo and values[-1] + step > hi:
+                return f'*/{step}'
+
+            return f'{values[0]}-{values[-1]}/{step}'
+
+    parts = []
+    run = [values[0]]
+
+    for v in values[1:]:
+        if v == run[-1] + 1:
+            run.append(v)
+        else:
+            parts.append(run)
+            run = [v]
+    parts.append(run)
+
+    return ','.join(
+        f'{r[0]}-{r[-1]}' if len(r) > 2 else ','.join(str(v) for v in r)
+        for r in parts
+    )
+
+
+def _shift_dow(field, days):
+    # 7 is also Sunday
+    values = parse_field(field, 0, 7)
+
+    if values is None:
+        return None
+
+    return render_field({(v + days) % 7 for v in values}, *FIELD_RANGES[4])
+
+
+def _shift_dom(field, days):
+    values = parse_field(field, *FIELD_RANGES[2])
+
+    if values is None:
+        return None
+
+    shifted = [v + days for v in values]
+
+    if min(shifted) < FIELD_RANGES[2][0] or max(shifted) > FIELD_RANGES[2][1]:
+        # Would cross into another month
+        return None
+
+    return render_field(shifted, *FIELD_RANGES[2])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _translate(expr, offset):
+    fields = expr.split()
+
+    if len(fields) != 5 or offset == 0:
+        return expr
+
+    minute, hour, dom, month, dow = fields
+
+    minutes = parse_field(minute, *FIELD_RANGES[0])
+    hours = parse_field(hour, *FIELD_RANGES[1])
+
+    if minutes is None or hours is None:
+        return expr
+
+    shifted = {}
+    for h in hours:
+        for m in minutes:
+            days, t = divmod(h * 60 + m + offset, 1440)
+            shifted.setdefault(days, set()).add(divmod(t, 60))
+
+    if len(shifted) > 1 and (dom != '*' or dow != '*'):
+        # Some times move to another day and others don't
+        return expr
+
+    days = next(iter(shifted))
+    pairs = set().union(*shifted.values())
+
+    new_hours = sorted({h for h, _ in pairs})
+    new_minutes = sorted({m for _, m in pairs})
+
+    if len(pairs) != len(new_hours) * len(new_minutes):
+        # Not expressible as one minute field times one hour field
+        return expr
+
+    if days and dow != '*':
+        dow = _shift_dow(dow, days)
+    if days and dom != '*':
+        dom = _shift_dom(dom, days)
+
+    if dow is None or dom is None:
+        return expr
+
+    return ' '.join([
+        render_field(new_minutes, *FIELD_RANGES[0]),
+        render_field(new_hours, *FIELD_RANGES[1]),
+        dom,
+        month,
+        dow
+    ])
+
+
+def translate(expr, from_tz='UTC', to_tz='America/New_York', at=None):
+    """Rewrites a five-field cron expression from one zone's wall clock
+    to another's
+
+    Minute, hour, day-of-month and day-of-week fields are all shifted,
+    including ranges, lists and steps. The offsets in effect at `at`
+    (default now) are used, so the result is correct across DST.
+    Expressions that can't be shifted exactly are returned unchanged.
+
+    Args:
+        expr (str): the cron expression in from_tz
+        from_tz (str, optional): zone the expression is written in
+        to_tz (str, optional): zone to express it in
+        at (datetime, optional): instant whose offsets are used
+
+    Returns:
+        str: the cron expression in to_tz
+    """
+
+    return _translate(' '.join(expr.split()), offset_minutes(from_tz, to_tz, at))
@@ -0,0 +1,76 @@
+import sys
+import json
+import socket
+
+from .constants import worker_socket
+
+TIMEOUT = 5
+
+
+class WorkerUnavailable(OSError):
+    """No worker is listening on the socket, so nothing was sent"""
+
+
+def dispatch(message, socket_path=worker_socket, timeout=TIMEOUT):
+    """Sends one request to the worker daemon and returns its reply
+
+    Raises:
+        WorkerUnavailable: if the worker is not reachable
+        OSError: if the request failed after it may have been received
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            raise WorkerUnavailable(str(e)) from e
+
+        sock.sendall((json.dumps(message) + '\n').encode())
+
+        reply = sock.makefile('rb').readline()
+
+    return json.loads(reply) if reply else dict(ok=False)
+
+
+def execute(task_id, socket_path=worker_socket):
+    try:
+        return dispatch(dict(action='execute', task_id=task_id), socket_path)
+    except WorkerUnavailable:
+        from .api import run_from_api
+
+        run_from_api(task_id)
+
+        return dict(ok=True, fallback=True)
+    except OSError as e:
+        # The worker may already have queued the task, so running it
+        # here could run it twice
+        return dict(ok=False, error=str(e))
+
+
+def main(argv=None):
+    """Cron entry point: python -m sprucepy.dispatch execute <task_id>
+
+    Hands the task to the worker daemon over its Unix socket and falls
+    back to calling the Spruce API directly when no worker is listening.
+    Only the standard library is imported on the fast path.
+    """
+
+    args = sys.argv[1:] if argv is None else argv
+
+    if len(args) != 2 or args[0] != 'execute':
+        print('usage: python -m sprucepy.dispatch execute <task_id>', file=sys.stderr)
+        return 2
+
+    reply = execute(args[1])
+
+    if not reply.get('ok'):
+        print('sprucepy dispatch failed: {}'.format(reply.get('error')), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
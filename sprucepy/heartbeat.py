@@ -0,0 +1,118 @@
+import threading
+from datetime import datetime, timezone
+from . import client
+
+DEFAULT_FREQUENCY = 10
+DEFAULT_TIMEOUT = 5
+
+
+class Heartbeat:
+    def __init__(
+        self,
+        ept,
+        frequency=DEFAULT_FREQUENCY,
+        timeout=DEFAULT_TIMEOUT,
+        name='heartbeat'
+    ):
+        """Sends one coalesced PATCH per tick to a run while it is running
+
+        Fields queued with update() and the output of any registered
+        providers are merged with the heartbeat timestamp into a single
+        request. The thread is a daemon and stops as soon as stop() is
+        called, so it never keeps the process alive.
+
+        Args:
+            ept (str): the run endpoint to PATCH
+            frequency (int, optional): seconds between ticks
+            timeout (int, optional): request timeout in seconds
+            name (str, optional): thread name
+        """
+        self.ept = ept
+        self.frequency = frequency
+        self.timeout = timeout
+        self.name = name
+
+        self._pending = {}
+        self._providers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def update(self, **fields):
+        """Queue fields to be sent with the next tick
+        """
+
+        with self._lock:
+            self._pending.update(fields)
+
+    def add_provider(self, provider):
+        """Register a callable returning a dict of fields for every tick
+        """
+
+        self._providers.append(provider)
+
+    def poke(self):
+        """Send the next tick now instead of waiting out the interval
+        """
+
+        self._wake.set()
+
+    def _payload(self):
+        with self._lock:
+            payload, self._pending = self._pending, {}
+
+        for provider in self._providers:
+            try:
+                payload.update(provider() or {})
+            except Exception:
+                pass
+
+        payload['heartbeat'] = datetime.now(timezone.utc)
+
+        return payload
+
+    def tick(self):
+        payload = self._payload()
+
+        try:
+            client.patch(self.ept, data=payload, timeout=self.timeout)
+        except Exception:
+            # A slow or failing API must not stop the heartbeat; queued
+            # fields that did not go out are retried on the next tick,
+            # unless the run is over and there won't be one
+            if self._stop.is_set():
+                return
+
+            with self._lock:
+                payload.update(self._pending)
+                self._pending = payload
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.tick()
+
+            self._wake.wait(self.frequency)
+            self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(
+            name=self.name, target=self._loop, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+        """Stop ticking and wait for any in-flight request to finish, so
+        no heartbeat lands after the run's final PATCH
+
+        Args:
+            timeout (int, optional): max seconds to wait; waits for the
+                request, retries included, by default
+        """
+
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
@@ -1,16 +1,48 @@
-from crontab import CronTab
-from datetime import datetime
+from crontab import CronTab, CronItem
+from datetime import datetime, timedelta
 import subprocess
-import pytz
 import time
 import re
-import pretty_cron
-from croniter import croniter
+import os
+import copy
+import fcntl
+import heapq
+import threading
+from collections import Counter
+from functools import lru_cache
+from .constants import cache_dir
+from .crontz import get_zone, offset_minutes, translate
+
+# Where root's crontab lives, used to notice edits made outside sprucepy
+CRONTAB_PATHS = [
+    '/var/spool/cron/crontabs/root',
+    '/var/spool/cron/root',
+]
+
+# Seconds to trust the cached crontab when its file can't be checked
+CRONTAB_TTL = 5
+
+# Schedule patterns, compiled once
+SCHED_PAT = re.compile(r'((?<=@)\w+)|(([A-z0-9/,*]+ ){4}([A-z0-9/,*]+ ?))')
+CRON_PAT = re.compile(r'([A-z0-9/,*]+ ){4}([A-z0-9/,*]+ ?)')
+
+# Parsed schedules kept in memory
+SCHEDULE_CACHE_SIZE = 1024
+
+# Seconds a run is assumed to take when its history is unknown
+DEFAULT_DURATION = 60
+
+# Days of projected runs the load-spreading planner scores against
+PLAN_HORIZON_DAYS = 28
+
+_crontab_cache = dict(stamp=None, loaded=0, index=None, jobs=None)
+_crontab_lock = threading.Lock()
 
 
 def _get_tz_offset(
     cron_timezone : str = 'UTC',
-    target_timezone : str = 'America/New_York'
+    target_timezone : str = 'America/New_York',
+    at : datetime = None
 ):
     """
     Calculates the time difference in hours between two timezones.
@@ -18,72 +50,149 @@ def _get_tz_offset(
     Args:
         cron_timezone (str): Timezone name (e.g., 'UTC', 'America/Los_Angeles').
         target_timezone (str): Timezone name (e.g., 'Australia/Sydney').
+        at (datetime): Instant whose offsets are used (defaults to now).
 
     Returns:
         float: Time difference in hours between cron_timezone and target_timezone.
     """
-    tz1 = pytz.timezone(target_timezone)
-    tz2 = pytz.timezone(cron_timezone)
+    return offset_minutes(cron_timezone, target_timezone, at) / 60
 
-    # Use a fixed datetime to avoid ambiguity
-    dt = datetime(2025, 3, 15, 12, 0, 0)  
 
-    dt_tz1 = tz1.localize(dt)
-    dt_tz2 = tz2.localize(dt)
+def _get_python_path():
+    return '/usr/local/bin/python3.9'
 
-    offset_seconds = (dt_tz2 - dt_tz1).total_seconds()
-    offset_hours = offset_seconds / 3600
 
-    return int(offset_hours)
+def _crontab_stamp():
+    for path in CRONTAB_PATHS:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            continue
 
+    return None
 
-def _get_python_path():
-    return '/usr/local/bin/python3.9'
 
+def invalidate_crontab():
+    """Forces the next lookup to re-read the crontab
+    """
+
+    with _crontab_lock:
+        _crontab_cache['index'] = None
 
-def find_job(name):
-    c = CronTab(user='root')
-    matches = list(c.find_comment(name))
 
-    return matches[0] if len(matches) > 0 else None
+def _load_crontab():
+    """Returns the cached crontab jobs and comment index, re-reading the
+    crontab only when it has changed (or, if its file can't be checked,
+    after CRONTAB_TTL)
+    """
+
+    stamp = _crontab_stamp()
+
+    with _crontab_lock:
+        cache = _crontab_cache
+
+        if stamp is None:
+            fresh = time.monotonic() - cache['loaded'] < CRONTAB_TTL
+        else:
+            fresh = stamp == cache['stamp']
+
+        if cache['index'] is None or not fresh:
+            jobs = list(CronTab(user='root'))
+
+            index = {}
+            for job in jobs:
+                index.setdefault(job.comment, job)
+
+            cache.update(stamp=stamp, loaded=time.monotonic(), index=index, jobs=jobs)
+
+        return dict(index=cache['index'], jobs=cache['jobs'])
+
+
+def _job_index():
+    """Returns a map of job comment to job from the cached crontab
+    """
+
+    return _load_crontab()['index']
+
+
+def find_job(name):
+    return _job_index().get(name)
 
 
 def _convert_cron_hour(
     sched,
     cron_timezone : str = 'UTC',
-    target_timezone : str = 'America/New_York'
+    target_timezone : str = 'America/New_York',
+    at : datetime = None
 ):
-    if re.search(re.compile('([A-z0-9/,*]+ ){4}([A-z0-9/,*]+ ?)'), sched):
-        TZ_OFFSET = _get_tz_offset(
-            cron_timezone=cron_timezone,
-            target_timezone=target_timezone
-        )
+    return translate(sched, cron_timezone, target_timezone, at)
+
+
+class ParsedSchedule:
+    def __init__(
+        self,
+        expr,
+        cron_timezone : str = 'UTC',
+        target_timezone : str = 'America/New_York'
+    ):
+        """A schedule expression parsed once and reused
+
+        Holds whether it is a five-field expression, its pretty text in
+        the target zone (per UTC offset, so it stays right across DST) and
+        a croniter template that new iterators are copied from.
+
+        Args:
+            expr (str): the cron expression or @ shortcut
+            cron_timezone (str, optional): zone the cron daemon runs in
+            target_timezone (str, optional): zone to describe the schedule in
+        """
+        self.expr = expr
+        self.cron_timezone = cron_timezone
+        self.target_timezone = target_timezone
+        self.is_cron = CRON_PAT.search(expr) is not None
+
+        self._pretty = {}
+        self._template = None
+
+    def pretty(self, at : datetime = None):
+        offset = offset_minutes(self.cron_timezone, self.target_timezone, at)
+
+        if offset not in self._pretty:
+            import pretty_cron
+
+            sched = _convert_cron_hour(
+                self.expr,
+                cron_timezone=self.cron_timezone,
+                target_timezone=self.target_timezone,
+                at=at
+            )
 
-        counter = 0
-        for r in re.finditer('[A-z0-9/,*]+ ', sched):
-            match = r
-            counter += 1
-            if counter > 1:
-                break
+            self._pretty[offset] = pretty_cron.prettify_cron(sched).capitalize()
 
-        try:
-            hour_component = int(match.group(0).strip())
-        except ValueError as err:
-            return sched
-
-        if hour_component + TZ_OFFSET < 0:
-            new_hour = (hour_component + 24 + TZ_OFFSET).__str__()
-        elif hour_component + TZ_OFFSET > 23:
-            new_hour = (hour_component - 24 + TZ_OFFSET).__str__()
-        else:
-            new_hour = (hour_component + TZ_OFFSET).__str__()
+        return self._pretty[offset]
 
-        sched_first = sched[:match.span()[0]]
-        sched_last = sched[match.span()[1]:]
+    def iter(self, start : datetime):
+        """Returns a croniter positioned at start
+        """
 
-        return f'{sched_first} {new_hour} {sched_last}'.replace('  ', ' ')
+        if self._template is None:
+            from croniter import croniter
 
-    return sched
+            self._template = croniter(self.expr, datetime.now(get_zone(self.cron_timezone)))
+
+        it = copy.copy(self._template)
+        it.set_current(start, force=True)
+
+        return it
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def parse_schedule(
+    expr,
+    cron_timezone : str = 'UTC',
+    target_timezone : str = 'America/New_York'
+):
+    return ParsedSchedule(expr, cron_timezone, target_timezone)
 
 
 def get_current_schedule(
@@ -97,20 +206,48 @@ def get_current_schedule(
     if job is None:
         return 'Not scheduled'
 
-    sched_pat = re.compile('((?<=@)\w+)|(([A-z0-9/,*]+ ){4}([A-z0-9/,*]+ ?))')
-
-    sched_str = re.search(sched_pat, job.__str__()).group(0).strip()
+    sched_str = SCHED_PAT.search(job.__str__()).group(0).strip()
 
     if prettify:
-        sched_str = _convert_cron_hour(
-            sched_str,
+        return parse_schedule(sched_str, cron_timezone, target_timezone).pretty()
+    else:
+        return sched_str.title()
+
+
+def get_current_schedules(
+    names,
+    prettify : bool = True,
+    cron_timezone : str = 'UTC',
+    target_timezone : str = 'America/New_York'
+):
+    """Returns the current schedule of many jobs from one crontab read
+
+    Returns:
+        dict: schedule string by job name
+    """
+
+    _job_index()
+
+    return {
+        name: get_current_schedule(
+            name,
+            prettify=prettify,
             cron_timezone=cron_timezone,
             target_timezone=target_timezone
         )
+        for name in names
+    }
 
-        return pretty_cron.prettify_cron(sched_str).capitalize()
-    else:
-        return sched_str.title()
+
+def _cron_running():
+    # Check if the cron service is running
+    res = subprocess.run(
+        'service cron status',
+        shell=True,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    return 'failed' not in res.stdout.decode()
 
 
 def get_next_run(
@@ -119,16 +256,12 @@ def get_next_run(
     cron_timezone : str = 'UTC',
     target_timezone : str = 'America/New_York'
 ):
-    if check_cron_status:
-        # Check if the cron service is running
-        res = subprocess.run(
-            'service cron status',
-            shell=True,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
+    """Returns the next time a job fires, in cron_timezone, whether it is
+    scheduled with five fields or an @ shortcut
+    """
 
-        if 'failed' in res.stdout.decode():
-            return 'Cron is not running!'
+    if check_cron_status and not _cron_running():
+        return 'Cron is not running!'
 
     sched = get_current_schedule(
         name,
@@ -137,26 +270,481 @@ def get_next_run(
         target_timezone=target_timezone
     )
 
-    target_now = datetime.now(tz=pytz.timezone(target_timezone))
+    # The crontab fires on the cron daemon's wall clock
+    cron_now = datetime.now(tz=get_zone(cron_timezone))
 
     if sched and sched != 'Not scheduled':
-        if re.search(re.compile('([A-z0-9/,*]+ ){4}([A-z0-9/,*]+ ?)'), sched):
-            c = croniter(sched, target_now)
+        parsed = parse_schedule(sched, cron_timezone, target_timezone)
+
+        if parsed.is_cron:
+            c = parsed.iter(cron_now)
             return c.get_next(datetime).astimezone(
-                pytz.timezone(cron_timezone)
+                get_zone(cron_timezone)
             )
 
         job = find_job(name)
+        c = parse_schedule(job.slices.clean_render(), cron_timezone, target_timezone).iter(cron_now)
+
+        return c.get_next(datetime).astimezone(
+            get_zone(cron_timezone)
+        )
 
-        return job.schedule(date_from=target_now).get_next(datetime)
 
+def get_next_runs(
+    names,
+    check_cron_status : bool = False,
+    cron_timezone : str = 'UTC',
+    target_timezone : str = 'America/New_York'
+):
+    """Returns the next run of many jobs from one crontab read
 
-def remove_job(name):
-    job = find_job(name)
+    Returns:
+        dict: next run datetime (or status string) by job name
+    """
+
+    if check_cron_status and not _cron_running():
+        return {name: 'Cron is not running!' for name in names}
+
+    _job_index()
+
+    return {
+        name: get_next_run(
+            name,
+            cron_timezone=cron_timezone,
+            target_timezone=target_timezone
+        )
+        for name in names
+    }
+
+
+def _set_frequency(job, frequency, start=None, interval=None):
+    # Clear any previous restrictions
+    job.clear()
+
+    # Set the job's frequency
+    if frequency == 'minutely':
+        job.minute.every(interval)
+    elif frequency == 'hourly':
+        job.hour.every(interval)
+        job.minute.on(0)
+    elif frequency == 'daily':
+        job.day.every(interval)
+    elif frequency == 'monthly':
+        job.month.every(interval)
+
+    # Set the job's start time
+    if start:
+        if frequency not in ['hourly', 'minutely']:
+            job.hour.on(start.hour)
+            job.minute.on(start.minute)
+
+        if frequency == 'hourly':
+            job.minute.on(start.minute)
+        if frequency == 'weekly':
+            job.dow.on(start.weekday() + 1)
+        if frequency == 'monthly':
+            job.day.on(start.day)
+    else:
+        if frequency == 'weekly':
+            job.dow.on(0)
+        if frequency == 'monthly':
+            job.day.on(1)
+
+        if frequency not in ['hourly', 'minutely']:
+            job.hour.on(0)
+            job.minute.on(0)
+
+
+class CronBatch:
+    def __init__(self, user='root', lock_path=None):
+        """Applies any number of schedule changes with one locked read and
+        one write of the crontab
+
+        Jobs whose command and schedule already match are left untouched,
+        and nothing is written if no job changed.
+
+        Args:
+            user (str, optional): whose crontab to edit
+            lock_path (str, optional): file used to serialize sprucepy writers
+        """
+        self.user = user
+        self.lock_path = lock_path or os.path.join(cache_dir, 'crontab.lock')
+        self.cron = None
+        self.counts = dict(created=0, updated=0, removed=0, unchanged=0)
+
+        self._lock_file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+
+        self._lock_file = open(self.lock_path, 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+        self.cron = CronTab(user=self.user)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            changed = self.counts['created'] + self.counts['updated'] + self.counts['removed']
+
+            if exc_type is None and changed:
+                self.cron.write()
+                invalidate_crontab()
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+
+    def remove_job(self, name):
+        jobs = list(self.cron.find_comment(name))
+
+        if jobs:
+            self.cron.remove(*jobs)
+            self.counts['removed'] += 1
+
+        return len(jobs) > 0
+
+    def create_task(
+        self,
+        name,
+        task_id,
+        python_path=None,
+        frequency=None,
+        start=None,
+        interval=None
+    ):
+        if frequency is None:
+            self.remove_job(name)
+            return
+
+        if python_path is None:
+            python_path = _get_python_path()
+
+        task = python_path + ' -m ' + 'sprucepy.dispatch execute {}'.format(task_id)
+
+        job = CronItem(command=task, comment=name)
+        _set_frequency(job, frequency, start=start, interval=interval)
+
+        existing = list(self.cron.find_comment(name))
+
+        if len(existing) == 1 and existing[0].is_enabled() \
+                and existing[0].command == job.command \
+                and str(existing[0].slices) == str(job.slices):
+            self.counts['unchanged'] += 1
+            return
+
+        if existing:
+            self.cron.remove(*existing)
+            self.counts['updated'] += 1
+        else:
+            self.counts['created'] += 1
+
+        job.cron = self.cron
+        self.cron.append(job)
+
+
+def sync_tasks(specs, prune_prefix=None):
+    """Creates, updates and removes many scheduled tasks in one crontab write
+
+    Args:
+        specs (list): dicts of create_task keyword arguments
+        prune_prefix (str, optional): also remove jobs whose comment starts
+            with this prefix but are not in specs
 
-    if job:
-        with CronTab(user='root') as cron:
-            cron.remove(job)
+    Returns:
+        dict: number of jobs created, updated, removed and unchanged
+    """
+
+    with CronBatch() as batch:
+        names = set()
+
+        for spec in specs:
+            batch.create_task(**spec)
+            names.add(spec['name'])
+
+        if prune_prefix:
+            stale = {
+                j.comment for j in batch.cron
+                if j.comment.startswith(prune_prefix) and j.comment not in names
+            }
+
+            for name in stale:
+                batch.remove_job(name)
+
+    return batch.counts
+
+
+def _fire_times(name, job, start, end):
+    from croniter import CroniterBadDateError
+
+    it = parse_schedule(job.slices.clean_render()).iter(start)
+
+    while True:
+        try:
+            t = it.get_next(datetime)
+        except CroniterBadDateError:
+            # The expression never fires, e.g. 0 0 31 2 *
+            return
+
+        if t > end:
+            return
+
+        yield t, name
+
+
+def project_runs(
+    start,
+    end,
+    names=None,
+    cron_timezone : str = 'UTC'
+):
+    """Projects every fire time of every scheduled job in a window
+
+    Each job's croniter is consumed lazily and the streams are merged
+    with a heap, so the output is sorted without a full sort.
+
+    Args:
+        start (datetime): window start; naive times are in cron_timezone,
+            aware times are converted to it
+        end (datetime): window end, inclusive
+        names (list, optional): only project these jobs (by comment)
+        cron_timezone (str, optional): timezone the cron daemon runs in
+
+    Returns:
+        dict: parallel 'time' and 'task' lists, sorted by time, which can
+            be passed straight to pandas.DataFrame
+    """
+
+    tz = get_zone(cron_timezone)
+    # Cron fields are read on the daemon's clock, so aware times are
+    # converted to it
+    start = start.astimezone(tz) if start.tzinfo else tz.localize(start)
+    end = end.astimezone(tz) if end.tzinfo else tz.localize(end)
+
+    # @reboot renders as * * * * * but never fires on a schedule
+    jobs = [
+        j for j in _load_crontab()['jobs']
+        if j.is_enabled() and j.is_valid() and j.slices.special != '@reboot'
+    ]
+
+    if names is not None:
+        names = set(names)
+        jobs = [j for j in jobs if j.comment in names]
+
+    streams = [
+        _fire_times(j.comment or j.command, j, start, end)
+        for j in jobs
+    ]
+
+    times = []
+    tasks = []
+    for t, name in heapq.merge(*streams, key=lambda r: r[0]):
+        times.append(t)
+        tasks.append(name)
+
+    return dict(time=times, task=tasks)
+
+
+def hot_minutes(projection, min_tasks : int = 2, top : int = None):
+    """Finds the minutes where several projected runs start together
+
+    Args:
+        projection (dict): output of project_runs
+        min_tasks (int, optional): minimum runs in a minute to report
+        top (int, optional): only return this many of the busiest minutes
+
+    Returns:
+        list: (minute, number of runs) tuples, busiest first
+    """
+
+    counts = Counter(t.replace(second=0, microsecond=0) for t in projection['time'])
+
+    busy = [(m, n) for m, n in counts.most_common() if n >= min_tasks]
+
+    return busy[:top] if top else busy
+
+
+def _minutes(seconds):
+    return max(1, -(-int(seconds) // 60))
+
+
+def _add_load(load, base, times, duration):
+    for t in times:
+        i = int((t - base).total_seconds() // 60)
+
+        for j in range(max(i, 0), min(i + _minutes(duration), len(load))):
+            load[j] += 1
+
+
+def _load_profile(base, durations, exclude=(), cron_timezone='UTC'):
+    """Counts the runs in progress in every minute of the plan horizon
+    """
+
+    load = [0] * (PLAN_HORIZON_DAYS * 1440)
+    end = base + timedelta(days=PLAN_HORIZON_DAYS)
+
+    projection = project_runs(base, end, cron_timezone=cron_timezone)
+
+    for t, name in zip(projection['time'], projection['task']):
+        if name not in exclude:
+            _add_load(load, base, [t], durations.get(name, DEFAULT_DURATION))
+
+    return load
+
+
+def _candidate_starts(frequency, step):
+    # A Sunday and the 1st of a month, so weekly and monthly tasks keep
+    # the same day they get when scheduled without a start
+    template = datetime(2023, 1, 1)
+
+    if frequency == 'hourly':
+        return [template.replace(minute=m) for m in range(0, 60, step)]
+    elif frequency in ['daily', 'weekly', 'monthly']:
+        return [
+            template.replace(hour=h, minute=m)
+            for h in range(24) for m in range(0, 60, step)
+        ]
+
+    return []
+
+
+def _planned_times(base, frequency, start, interval):
+    job = CronItem(command='plan')
+    _set_frequency(job, frequency, start=start, interval=interval)
+
+    end = base + timedelta(days=PLAN_HORIZON_DAYS)
+
+    return [t for t, _ in _fire_times(None, job, base, end)]
+
+
+def _best_start(load, base, frequency, interval, duration, step):
+    candidates = _candidate_starts(frequency, step)
+
+    if not candidates:
+        return None
+
+    # Candidates only differ in hour and minute, so each one fires at the
+    # first candidate's times shifted by a fixed number of minutes
+    first = candidates[0]
+    minutes = [
+        int((t - base).total_seconds() // 60)
+        for t in _planned_times(base, frequency, first, interval)
+    ]
+    width = _minutes(duration)
+
+    best = None
+    best_cost = None
+
+    for start in candidates:
+        offset = int((start - first).total_seconds() // 60)
+        cost = sum(sum(load[i + offset:i + offset + width]) for i in minutes)
+
+        if best_cost is None or cost < best_cost:
+            best, best_cost = start, cost
+
+    return best
+
+
+def _plan_base(cron_timezone):
+    tz = get_zone(cron_timezone)
+
+    return tz.localize(datetime.now(tz).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0))
+
+
+def plan_start(
+    frequency,
+    interval=None,
+    duration : float = DEFAULT_DURATION,
+    durations : dict = None,
+    exclude=(),
+    step : int = 5,
+    cron_timezone : str = 'UTC'
+):
+    """Picks a start time for a new task that overlaps the fewest runs
+    already scheduled
+
+    Args:
+        frequency (str): the task's frequency
+        interval (int, optional): the task's interval
+        duration (float, optional): typical run time of the task in seconds
+        durations (dict, optional): typical run time in seconds by job name
+        exclude (iterable, optional): job names to leave out of the load
+        step (int, optional): minute granularity of the candidates
+        cron_timezone (str, optional): timezone the cron daemon runs in
+
+    Returns:
+        datetime: a start to pass to create_task, or None if the
+            frequency has no placement choice
+    """
+
+    if not _candidate_starts(frequency, step):
+        return None
+
+    base = _plan_base(cron_timezone)
+    load = _load_profile(base, durations or {}, exclude, cron_timezone)
+
+    return _best_start(load, base, frequency, interval, duration, step)
+
+
+def rebalance(
+    specs,
+    durations : dict = None,
+    step : int = 5,
+    cron_timezone : str = 'UTC'
+):
+    """Re-places tasks to spread load, longest running first, and
+    applies the result in one crontab write
+
+    Args:
+        specs (list): dicts of create_task keyword arguments to re-place
+        durations (dict, optional): typical run time in seconds by job name
+        step (int, optional): minute granularity of the candidates
+        cron_timezone (str, optional): timezone the cron daemon runs in
+
+    Returns:
+        list: the specs with their new start times
+    """
+
+    durations = durations or {}
+    names = {s['name'] for s in specs}
+
+    base = _plan_base(cron_timezone)
+    load = _load_profile(base, durations, names, cron_timezone)
+
+    ordered = sorted(
+        specs,
+        key=lambda s: durations.get(s['name'], DEFAULT_DURATION),
+        reverse=True
+    )
+
+    planned = []
+    for spec in ordered:
+        spec = dict(spec)
+        duration = durations.get(spec['name'], DEFAULT_DURATION)
+        start = _best_start(
+            load, base, spec.get('frequency'), spec.get('interval'), duration, step)
+
+        if start is not None:
+            spec['start'] = start
+
+        if spec.get('frequency'):
+            _add_load(
+                load,
+                base,
+                _planned_times(base, spec['frequency'], spec.get('start'), spec.get('interval')),
+                duration
+            )
+
+        planned.append(spec)
+
+    sync_tasks(planned)
+
+    return planned
+
+
+def remove_job(name):
+    with CronBatch() as batch:
+        batch.remove_job(name)
 
 
 def create_task(
@@ -167,54 +755,12 @@ def create_task(
     start=None,
     interval=None
 ):
-    if python_path is None:
-        python_path = _get_python_path()
-
-    # Remove the job if it exists
-    remove_job(name)
-
-    if frequency is None:
-        return
-
-    task = python_path + ' -m ' + 'sprucepy.api execute {}'.format(task_id)
-
-    with CronTab(user='root') as cron:
-        # Check if a job for this task already exists
-        m = list(cron.find_comment(name))
-        job = m[0] if len(m) > 0 else cron.new(command=task, comment=name)
-
-        # Clear any previous restrictions
-        job.clear()
-
-        # Set the job's frequency
-        if frequency == 'minutely':
-            job.minute.every(interval)
-        elif frequency == 'hourly':
-            job.hour.every(interval)
-            job.minute.on(0)
-        elif frequency == 'daily':
-            job.day.every(interval)
-        elif frequency == 'monthly':
-            job.month.every(interval)
-
-        # Set the job's start time
-        if start:
-            if frequency not in ['hourly', 'minutely']:
-                job.hour.on(start.hour)
-                job.minute.on(start.minute)
-
-            if frequency == 'hourly':
-                job.minute.on(start.minute)
-            if frequency == 'weekly':
-                job.dow.on(start.weekday() + 1)
-            if frequency == 'monthly':
-                job.day.on(start.day)
-        else:
-            if frequency == 'weekly':
-                job.dow.on(0)
-            if frequency == 'monthly':
-                job.day.on(1)
-
-            if frequency not in ['hourly', 'minutely']:
-                job.hour.on(0)
-                job.minute.on(0)
+    with CronBatch() as batch:
+        batch.create_task(
+            name,
+            task_id,
+            python_path=python_path,
+            frequency=frequency,
+            start=start,
+            interval=interval
+        )
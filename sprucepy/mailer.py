@@ -0,0 +1,297 @@
+import os
+import time
+import atexit
+import smtplib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_POOL_SIZE = int(os.getenv('SPRUCE_SMTP_POOL_SIZE', 2))
+DEFAULT_TIMEOUT = float(os.getenv('SPRUCE_SMTP_TIMEOUT', 30))
+# Relays usually drop idle sessions after a minute or so
+DEFAULT_IDLE = float(os.getenv('SPRUCE_SMTP_IDLE', 60))
+DEFAULT_SEND_WORKERS = int(os.getenv('SPRUCE_MAIL_WORKERS', 2))
+# Bytes handed to the socket at a time when streaming a message
+STREAM_CHUNK = 64 * 1024
+
+
+def _rset(conn):
+    try:
+        conn.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def send_stream(conn, from_addr, to_addrs, fp, chunk_size=STREAM_CHUNK):
+    """Like SMTP.sendmail, but streams the message from a file
+
+    The file must hold the message with CRLF line endings. Lines are
+    dot-stuffed as they are sent, so the message is never in memory.
+
+    Returns:
+        dict: refused recipients, as SMTP.sendmail does
+    """
+
+    conn.ehlo_or_helo_if_needed()
+
+    code, resp = conn.mail(from_addr)
+    if code != 250:
+        _rset(conn)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for addr in to_addrs:
+        code, resp = conn.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+
+    if len(refused) == len(to_addrs):
+        _rset(conn)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = conn.docmd('data')
+    if code != 354:
+        _rset(conn)
+        raise smtplib.SMTPDataError(code, resp)
+
+    fp.seek(0)
+
+    buf = []
+    size = 0
+    line = b'\r\n'
+    for line in fp:
+        if line.startswith(b'.'):
+            line = b'.' + line
+
+        buf.append(line)
+        size += len(line)
+
+        if size >= chunk_size:
+            conn.send(b''.join(buf))
+            buf = []
+            size = 0
+
+    if not line.endswith(b'\r\n'):
+        buf.append(b'\r\n')
+    buf.append(b'.\r\n')
+    conn.send(b''.join(buf))
+
+    code, resp = conn.getreply()
+    if code != 250:
+        _rset(conn)
+        raise smtplib.SMTPDataError(code, resp)
+
+    return refused
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        server,
+        size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        idle_timeout=DEFAULT_IDLE
+    ):
+        """Keep-alive SMTP sessions to one relay, shared across threads
+
+        Idle sessions are checked with NOOP before reuse and replaced if
+        the relay has dropped them.
+
+        Args:
+            server (str): the SMTP relay host
+            size (int, optional): max sessions open at once
+            timeout (float, optional): socket timeout in seconds
+            idle_timeout (float, optional): seconds before an idle session is closed
+        """
+        self.server = server
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @staticmethod
+    def _quit(conn):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    def _healthy(self, conn, last_used):
+        if time.monotonic() - last_used > self.idle_timeout:
+            self._quit(conn)
+            return False
+
+        try:
+            return conn.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+            return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+
+            if self._healthy(conn, last_used):
+                return conn
+
+        return smtplib.SMTP(self.server, timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        """Yields a live session, returning it to the pool afterwards
+        """
+
+        self._slots.acquire()
+        conn = None
+
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            # Keep the session only if it's still usable after the error
+            if conn is not None:
+                try:
+                    conn.rset()
+                except (smtplib.SMTPException, OSError):
+                    conn.close()
+                    conn = None
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Sends on a pooled session, retrying once on a fresh session if
+        the relay dropped it
+
+        Args:
+            from_addr (str): envelope sender
+            to_addrs (list): envelope recipients
+            msg (str, bytes or file): the message; files are streamed
+        """
+
+        def send(conn):
+            if hasattr(msg, 'read'):
+                return send_stream(conn, from_addr, to_addrs, msg)
+
+            return conn.sendmail(from_addr, to_addrs, msg)
+
+        try:
+            with self.connection() as conn:
+                return send(conn)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection() as conn:
+                return send(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn, _ in idle:
+            self._quit(conn)
+
+
+class SendQueue:
+    def __init__(self, workers=DEFAULT_SEND_WORKERS):
+        """Background threads that deliver queued mail
+
+        Pending sends are finished before the interpreter exits.
+
+        Args:
+            workers (int, optional): sends in flight at once
+        """
+        self.workers = workers
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mail')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        future = self._pool.submit(fn, *args, **kwargs)
+
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout=None):
+        """Waits for queued sends to finish
+
+        Returns:
+            bool: True if nothing is left pending
+        """
+
+        with self._lock:
+            pending = list(self._pending)
+
+        return not wait(pending, timeout=timeout).not_done
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_pools = {}
+_queue = None
+_lock = threading.Lock()
+
+
+def get_pool(server):
+    """Returns the process-wide pool for a relay, creating it on first use
+    """
+
+    with _lock:
+        if server not in _pools:
+            _pools[server] = SMTPPool(server)
+
+        return _pools[server]
+
+
+def get_queue():
+    """Returns the process-wide send queue, creating it on first use
+    """
+
+    global _queue
+
+    with _lock:
+        if _queue is None:
+            _queue = SendQueue()
+
+        return _queue
+
+
+def flush(timeout=None):
+    return _queue is None or _queue.flush(timeout)
+
+
+def close():
+    """Finishes queued sends and closes every pooled session
+    """
+
+    global _queue
+
+    with _lock:
+        queue, _queue = _queue, None
+        pools = list(_pools.values())
+        _pools.clear()
+
+    if queue is not None:
+        queue.shutdown(wait=True)
+
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close)
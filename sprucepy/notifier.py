@@ -1,26 +1,176 @@
-import requests
+from . import client
+from . import mailer
 import os
+import sys
+import gzip
+import uuid
+import base64
+import shutil
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import tempfile
 import mimetypes
+import email
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
-from email import encoders
 from urllib.parse import urljoin
 from .constants import api_url
 
 from sprucepy.secrets import get_secret_by_key
-import boto3
 
 notification_ept = 'notifications'
+notification_bulk_ept = 'notifications/bulk'
 recipient_ept = 'recipients'
 
+# Rendered messages larger than this are spooled to disk
+SPOOL_BYTES = int(os.getenv('SPRUCE_MAIL_SPOOL_BYTES', 1024 * 1024))
 
-def get_recipients(task_id, category, api_url=api_url):
-    if task_id is None:
-        return [{}]
 
+# Seconds to keep recipient lists in memory; 0 disables the cache
+RECIPIENT_CACHE_TTL = float(os.getenv('SPRUCE_RECIPIENT_CACHE_TTL', 60))
+RECIPIENT_CACHE_SIZE = 256
+
+_recipients = OrderedDict()
+_recipients_inflight = {}
+_recipients_lock = threading.Lock()
+
+# Post notification records to the bulk endpoint; off until the API has it
+NOTIFICATION_BULK = os.getenv('SPRUCE_NOTIFICATION_BULK', '').lower() in ('1', 'true', 'yes')
+
+# API urls found to lack the bulk endpoint
+_no_bulk = set()
+_log_queue = None
+_log_lock = threading.Lock()
+
+
+def get_log_queue():
+    """Returns the background queue notification records are posted from
+    """
+
+    global _log_queue
+
+    with _log_lock:
+        if _log_queue is None:
+            _log_queue = mailer.SendQueue(workers=1)
+
+        return _log_queue
+
+
+class NotificationLog:
+    # Records per bulk request
+    batch_size = 100
+
+    def __init__(self, api_url=api_url, bulk=None):
+        """Buffers notification records and posts them once sending is done
+
+        With bulk on, each batch goes to the bulk endpoint with every
+        distinct body sent once and referenced from the records by its
+        SHA-256. Records are posted one at a time with their body, as
+        before, when bulk is off or a bulk request doesn't succeed.
+
+        Args:
+            api_url (str, optional): the Spruce API url
+            bulk (bool, optional): use the bulk endpoint; defaults to
+                NOTIFICATION_BULK (SPRUCE_NOTIFICATION_BULK)
+        """
+        self.api_url = api_url
+        self.bulk = NOTIFICATION_BULK if bulk is None else bulk
+        self.records = []
+        self.bodies = {}
+
+    def add(self, body, **record):
+        digest = hashlib.sha256(body.encode()).hexdigest()
+
+        self.bodies[digest] = body
+        self.records.append(dict(record, body_hash=digest))
+
+    def _post_bulk(self, batch, bodies):
+        if not self.bulk or self.api_url in _no_bulk:
+            return False
+
+        payload = dict(
+            bodies={r['body_hash']: bodies[r['body_hash']] for r in batch},
+            notifications=batch
+        )
+
+        try:
+            r = client.post(urljoin(self.api_url, notification_bulk_ept), json=payload)
+        except OSError as e:
+            print(f'Bulk notification post failed, posting one by one: {e}', file=sys.stderr)
+            return False
+
+        if r.status_code in (404, 405):
+            _no_bulk.add(self.api_url)
+            return False
+
+        if not 200 <= r.status_code < 300:
+            print(f'Bulk notification post failed ({r.status_code}), posting one by one', file=sys.stderr)
+            return False
+
+        return True
+
+    def _post_one(self, record, bodies):
+        payload = dict(record)
+        payload['body'] = bodies[payload.pop('body_hash')]
+
+        try:
+            r = client.post(urljoin(self.api_url, notification_ept), data=payload)
+        except OSError as e:
+            print(f'Notification post failed: {e}', file=sys.stderr)
+            return False
+
+        if not 200 <= r.status_code < 300:
+            print(f'Notification post failed ({r.status_code}): {r.text}', file=sys.stderr)
+            return False
+
+        return True
+
+    def flush(self):
+        """Posts the buffered records
+
+        Returns:
+            list: the records that could not be posted
+        """
+
+        records, self.records = self.records, []
+        bodies, self.bodies = self.bodies, {}
+
+        failed = []
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+
+            if not self._post_bulk(batch, bodies):
+                failed.extend(r for r in batch if not self._post_one(r, bodies))
+
+        return failed
+
+
+def invalidate_recipients(task_id=None, category=None, api_url=api_url):
+    """Drop cached recipient lists
+
+    Args:
+        task_id (optional): the task to drop; all tasks when None
+        category (str, optional): the category to drop; all categories when None
+        api_url (str, optional): the root url the lists were fetched from
+    """
+
+    with _recipients_lock:
+        for key in list(_recipients):
+            if (
+                key[2] == api_url
+                and (task_id is None or key[0] == str(task_id))
+                and (category is None or key[1] == category)
+            ):
+                del _recipients[key]
+
+
+def _fetch_recipients(task_id, category, api_url):
     # Get the list to notify from the task
     ept = urljoin(api_url, recipient_ept)
 
@@ -29,9 +179,73 @@ def get_recipients(task_id, category, api_url=api_url):
         category=category
     )
 
-    r = requests.get(ept, params=payload)
+    r = client.get(ept, params=payload)
+
+    return 200 <= r.status_code < 300, r.json()
+
+
+def _copy_recipients(recipients):
+    # Error bodies are passed through as they are
+    if isinstance(recipients, list):
+        return [dict(d) for d in recipients]
+
+    return recipients
+
+
+def get_recipients(task_id, category, api_url=api_url, ttl=None):
+    """Returns the people to notify for a task and category
+
+    Successful lists are cached for RECIPIENT_CACHE_TTL seconds, and
+    concurrent lookups of the same list share one request. Error
+    responses are returned as the API sent them and never cached.
+
+    Args:
+        task_id: the task
+        category (str): the notification category, e.g. output or error
+        api_url (str, optional): the Spruce API url
+        ttl (float, optional): seconds to cache the list for; 0 disables
+    """
+
+    if task_id is None:
+        return [{}]
+
+    ttl = RECIPIENT_CACHE_TTL if ttl is None else ttl
+    key = (str(task_id), category, api_url)
 
-    return r.json()
+    with _recipients_lock:
+        hit = _recipients.get(key)
+
+        if hit is not None and hit[1] > time.monotonic():
+            _recipients.move_to_end(key)
+            return _copy_recipients(hit[0])
+
+        future = _recipients_inflight.get(key)
+        owner = future is None
+
+        if owner:
+            future = Future()
+            _recipients_inflight[key] = future
+
+    if owner:
+        try:
+            ok, recipients = _fetch_recipients(task_id, category, api_url)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(recipients)
+        finally:
+            with _recipients_lock:
+                del _recipients_inflight[key]
+
+                if future.exception() is None and ok and isinstance(recipients, list) and ttl > 0:
+                    _recipients[key] = (recipients, time.monotonic() + ttl)
+                    _recipients.move_to_end(key)
+
+                    while len(_recipients) > RECIPIENT_CACHE_SIZE:
+                        _recipients.popitem(last=False)
+
+    return _copy_recipients(future.result())
 
 
 def get_recipient_emails(recipient_list=None, task_id=None, category=None, api_url=api_url):
@@ -60,6 +274,13 @@ def get_recipient_attrs(attr, recipient_list=None, task_id=None, category=None,
 
 
 class Email:
+    # Recipients per SMTP envelope; relays commonly cap this at 50-100
+    max_recipients = 50
+
+    # Bytes of attachment encoded at a time; a multiple of 57 keeps
+    # every base64 line 76 characters long
+    chunk_size = 57 * 1152
+
     def __init__(
         self,
         recipients,
@@ -71,8 +292,21 @@ class Email:
         run=None,
         category='output',
         object='task',
-        server='SMTPRelay.montefiore.org'
+        server='SMTPRelay.montefiore.org',
+        compress_over=None
     ):
+        """An email with optional file attachments
+
+        Attachments are not read until the message is rendered for
+        sending, and are then base64-encoded in chunks into a spooled
+        temporary file, so memory use stays flat however large they are.
+
+        Args:
+            recipients (dict): to, cc and bcc lists of (person, email) tuples
+            body (str): the message body
+            attachment (str or list, optional): paths of files to attach
+            compress_over (int, optional): gzip attachments larger than this many bytes
+        """
         self.attachment = attachment
         self.email_list = recipients['to']
         self.cc_email_list = recipients['cc']
@@ -86,12 +320,26 @@ class Email:
         self.object = object
         self.mode = 'email'
         self.server = server
+        self.compress_over = compress_over
 
         self.build_email()
 
     def build_and_send(self, api_url=api_url, standalone=False):
-        self.build_email()
-        self.send_email(api_url=api_url, standalone=standalone)
+        # The message was already built in __init__
+        return self.send_email(api_url=api_url, standalone=standalone)
+
+    def enqueue(self, api_url=api_url, standalone=False):
+        """Queues the email for delivery on a background thread
+
+        Sends go out over the shared SMTP pool and are finished before
+        the process exits.
+
+        Returns:
+            Future: resolves when the send is done
+        """
+
+        return mailer.get_queue().submit(
+            self.send_email, api_url=api_url, standalone=standalone)
 
     def build_email(self):
         subject = self.subject
@@ -108,6 +356,8 @@ class Email:
         msg['Subject'] = self.subject
         msg.attach(MIMEText(self.body_text, self.body_type))
 
+        self._attachments = []
+
         if attachment is not None:
             attachment = [attachment] if type(
                 attachment) != list else attachment
@@ -118,14 +368,23 @@ class Email:
                 except:
                     pretty_filename = a
 
-                with open(a, "rb") as att:
+                compress = self.compress_over is not None and os.path.getsize(a) > self.compress_over
+
+                if compress:
+                    part = MIMEBase("application", "gzip")
+                    pretty_filename = pretty_filename + '.gz'
+                else:
                     # Add file as application/octet-stream
                     # Email client can usually download this automatically as attachment
                     part = MIMEBase("application", "octet-stream")
-                    part.set_payload(att.read())
 
-                # Encode file in ASCII characters to send by email
-                encoders.encode_base64(part)
+                # The encoded file is streamed in place of the marker
+                # when the message is rendered
+                marker = 'spruce-attachment-{}'.format(uuid.uuid4().hex)
+                part.set_payload(marker)
+                part['Content-Transfer-Encoding'] = 'base64'
+
+                self._attachments.append((marker, a, compress))
 
                 # Add header as key/value pair to attachment part
                 part.add_header(
@@ -136,63 +395,147 @@ class Email:
                 # Add attachment to message and convert message to string
                 msg.attach(part)
 
-        self.msg = msg
+        # Attachments are markers here until render() streams them in
+        self._skeleton = msg
+        self._msg = None
+        self._raw = None
+
+    @property
+    def msg(self):
+        """The full message with its attachments, parsed from a render
+
+        Reading this holds every attachment in memory; sending doesn't.
+        """
+
+        if self._msg is None:
+            with self.render() as rendered:
+                self._msg = email.message_from_binary_file(rendered)
+
+        return self._msg
+
+    @msg.setter
+    def msg(self, msg):
+        self._skeleton = msg
+        self._attachments = []
+        self._msg = msg
+        self._raw = None
+
+    def _write_attachment(self, out, path, compress):
+        src = open(path, 'rb')
+
+        if compress:
+            packed = tempfile.TemporaryFile()
+
+            with src, gzip.GzipFile(os.path.basename(path), 'wb', fileobj=packed) as gz:
+                shutil.copyfileobj(src, gz, self.chunk_size)
+
+            packed.seek(0)
+            src = packed
+
+        with src:
+            for i, chunk in enumerate(iter(lambda: src.read(self.chunk_size), b'')):
+                if i:
+                    out.write(b'\r\n')
+                out.write(base64.encodebytes(chunk).rstrip(b'\n').replace(b'\n', b'\r\n'))
+
+    def render(self):
+        """Renders the message with CRLF line endings to a spooled file
+
+        Returns:
+            SpooledTemporaryFile: the message, rewound
+        """
+
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        rest = self._skeleton.as_bytes(policy=self._skeleton.policy.clone(linesep='\r\n'))
+
+        for marker, path, compress in self._attachments:
+            head, rest = rest.split(marker.encode(), 1)
+
+            out.write(head)
+            self._write_attachment(out, path, compress)
+
+        out.write(rest)
+        out.seek(0)
+
+        return out
+
+    @property
+    def raw(self):
+        """The rendered message, built once and reused for every send
+        """
+
+        if self._raw is None:
+            self._raw = self.render()
+
+        return self._raw
+
+    def _record_send(self, log, person, error=None):
+        record = dict(
+            run=self.run,
+            person=person,
+            category=self.category,
+            object=self.object,
+            mode=self.mode,
+            return_code=0 if error is None else 1
+        )
+
+        if error is not None:
+            record['error_text'] = str(error)
+
+        log.add(self.body_text, **record)
 
     def send_email(self, msg=None, api_url=api_url, standalone=False):
+        """Sends the email and records each send with the API
+
+        The records are posted from a background queue once delivery is
+        done, so the API never holds up the relay.
+
+        Args:
+            msg (Message, optional): send this message instead of the
+                email's own, which is rendered with streamed attachments
+            api_url (str, optional): the Spruce API url
+            standalone (bool, optional): don't record the sends
+
+        Returns:
+            Future: resolves to the records that could not be posted, or
+                None if standalone
+        """
+
         if msg is None:
-            msg = self.msg
+            raw = self.raw
+        else:
+            # smtplib only fixes line endings of str messages
+            raw = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
 
-        ept = urljoin(api_url, notification_ept)
+        log = NotificationLog(api_url)
 
-        try:
-            with smtplib.SMTP(self.server) as server:
-                for sendto in set(self.email_list) | set(self.cc_email_list) | set(self.bcc_email_list):
-                    try:
-                        # Send the email to this specific email address
-                        server.sendmail(self.from_email,
-                                        sendto[1], msg.as_string())
-
-                        # Send a POST to the API recording the send
-                        if not standalone:
-                            payload = dict(
-                                run=self.run,
-                                person=sendto[0],
-                                category=self.category,
-                                object=self.object,
-                                mode=self.mode,
-                                body=self.body_text,
-                                return_code=0
-                            )
-
-                            requests.post(ept, data=payload)
-
-                    except Exception as e:
-                        # Send a POST to the API recording the error
-                        if not standalone:
-                            payload = dict(
-                                run=self.run,
-                                person=sendto[0],
-                                category=self.category,
-                                object=self.object,
-                                mode=self.mode,
-                                body=self.body_text,
-                                return_code=1,
-                                error_text=e
-                            )
-
-                            requests.post(ept, data=payload)
-        except Exception as e:
-            for sendto in self.email_list:
-                # Send a POST to the API recording the error
-                payload = dict(
-                    run=self.run,
-                    person=sendto[0],
-                    category=self.category,
-                    object=self.object,
-                    mode=self.mode,
-                    body=self.body_text,
-                    return_code=1,
-                    error_text=e
-                )
+        # Each address gets one copy, whoever it's listed for
+        people = {}
+        for person, address in set(self.email_list) | set(self.cc_email_list) | set(self.bcc_email_list):
+            people.setdefault(address, []).append(person)
+
+        addresses = list(people)
+        pool = mailer.get_pool(self.server)
+
+        for i in range(0, len(addresses), self.max_recipients):
+            batch = addresses[i:i + self.max_recipients]
+
+            try:
+                # One envelope for the whole batch; returns refused addresses
+                refused = pool.sendmail(self.from_email, batch, raw)
+            except smtplib.SMTPRecipientsRefused as e:
+                refused = e.recipients
+            except Exception as e:
+                refused = {address: e for address in batch}
+
+            if standalone:
+                continue
+
+            for address in batch:
+                for person in people[address]:
+                    self._record_send(log, person, refused.get(address))
+
+        if standalone:
+            return None
 
-                requests.post(ept, data=payload)
+        return get_log_queue().submit(log.flush)
@@ -3,16 +3,372 @@ import subprocess
 import re
 import pkgutil
 import sys
-from .constants import ineligible_packages # TODO: add back in relative reference dot
+import ast
+import json
+import hashlib
+import fnmatch
+import importlib.metadata
+import sysconfig
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .constants import ineligible_packages, package_aliases, cache_dir # TODO: add back in relative reference dot
+
+
+def extract_imports(path):
+    """Returns the top-level modules imported anywhere in a Python file
+
+    Relative imports are skipped. Files that fail to parse yield nothing.
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            tree = ast.parse(file.read(), filename=path)
+    except (SyntaxError, ValueError, OSError):
+        return []
+
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules += [a.name.split('.')[0] for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.append(node.module.split('.')[0])
+
+    return list(dict.fromkeys(modules))
+
+
+class ImportCache:
+    """On-disk cache of extracted imports for one project directory
+
+    Entries are keyed by file path and invalidated when the file's mtime
+    or size changes.
+    """
+
+    def __init__(self, pwd, directory=cache_dir):
+        digest = hashlib.sha1(os.path.abspath(pwd).encode()).hexdigest()[:16]
+
+        self.path = os.path.join(directory, f'imports_{digest}.json')
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+
+        return [st.st_mtime_ns, st.st_size]
+
+    def get(self, path):
+        entry = self.entries.get(path)
+
+        try:
+            if entry is not None and entry['stamp'] == self._stamp(path):
+                return entry['imports']
+        except OSError:
+            pass
+
+        return None
+
+    def set(self, path, imports):
+        try:
+            self.entries[path] = dict(stamp=self._stamp(path), imports=imports)
+            self.dirty = True
+        except OSError:
+            pass
+
+    def save(self, keep=None):
+        if keep is not None:
+            keep = set(keep)
+            stale = [p for p in self.entries if p not in keep]
+
+            for p in stale:
+                del self.entries[p]
+
+            self.dirty = self.dirty or len(stale) > 0
+
+        if not self.dirty:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as file:
+                json.dump(self.entries, file)
+
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            # The cache is an optimization only
+            pass
+
+
+_installed = None
+_distributions = None
+
+
+def packages_distributions():
+    """Maps top-level module names to the distributions that provide them
+
+    Uses importlib.metadata.packages_distributions where available and
+    rebuilds the same mapping from distribution metadata on Python 3.9.
+    """
+
+    if hasattr(importlib.metadata, 'packages_distributions'):
+        return importlib.metadata.packages_distributions()
+
+    mapping = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata['Name']
+        top_level = dist.read_text('top_level.txt')
+
+        if top_level:
+            modules = top_level.split()
+        else:
+            modules = {
+                f.parts[0] if len(f.parts) > 1 else f.with_suffix('').name
+                for f in dist.files or []
+                if f.suffix == '.py'
+            }
+
+        for m in modules:
+            mapping.setdefault(m, []).append(name)
+
+    return mapping
+
+
+def distribution_map(refresh=False):
+    """Returns a cached map of installed module name to distribution name
+    """
+
+    global _distributions
+
+    if _distributions is None or refresh:
+        _distributions = {m: d[0] for m, d in packages_distributions().items() if d}
+
+    return _distributions
+
+
+def installed_modules(refresh=False):
+    """Returns a cached snapshot of the importable top-level module names
+
+    The snapshot is built once per process; pass refresh=True or call
+    invalidate_installed after installing packages.
+    """
+
+    global _installed
+
+    if _installed is None or refresh:
+        names = set(sys.builtin_module_names)
+        names.update(getattr(sys, 'stdlib_module_names', ()))
+        names.update(distribution_map(refresh))
+
+        # Covers modules on sys.path without distribution metadata
+        names.update(m.name for m in pkgutil.iter_modules())
+
+        _installed = frozenset(names)
+
+    return _installed
+
+
+def stdlib_modules():
+    """Returns the top-level module names of the standard library
+    """
+
+    if hasattr(sys, 'stdlib_module_names'):
+        return frozenset(sys.stdlib_module_names) | frozenset(sys.builtin_module_names)
+
+    stdlib = sysconfig.get_paths()['stdlib']
+    paths = [stdlib, os.path.join(stdlib, 'lib-dynload')]
+
+    return frozenset(m.name for m in pkgutil.iter_modules(paths)) | frozenset(sys.builtin_module_names)
+
+
+def invalidate_installed():
+    global _installed, _distributions
+
+    _installed = None
+    _distributions = None
+
+
+def load_package_map(path):
+    """Reads `module = distribution` lines from a package map file
+
+    A module with no distribution is never installed.
+    """
+
+    mapping = {}
+
+    try:
+        with open(path, 'r') as file:
+            lines = [l.split('#')[0].strip() for l in file]
+    except OSError:
+        return mapping
+
+    for l in lines:
+        if '=' not in l:
+            continue
+
+        module, dist = [x.strip() for x in l.split('=', 1)]
+        mapping[module] = dist or None
+
+    return mapping
+
+
+def _path_stamps():
+    stamps = []
+    for p in sys.path:
+        try:
+            stamps.append([p, os.stat(p or '.').st_mtime_ns])
+        except OSError:
+            pass
+
+    return stamps
+
+
+class SatisfiedCache:
+    """Persists the last dependency fingerprint known to be satisfied
+    for each project directory
+    """
+
+    def __init__(self, directory=cache_dir):
+        self.path = os.path.join(directory, 'satisfied.json')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, pwd):
+        return self._load().get(os.path.abspath(pwd))
+
+    def _save(self, entries):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as file:
+                json.dump(entries, file)
+
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def set(self, pwd, fingerprint):
+        entries = self._load()
+        entries[os.path.abspath(pwd)] = fingerprint
+
+        self._save(entries)
+
+    def clear(self, pwd=None):
+        """Forgets the fingerprint for one project, or for all when None
+        """
+
+        if pwd is None:
+            entries = {}
+        else:
+            entries = self._load()
+            entries.pop(os.path.abspath(pwd), None)
+
+        self._save(entries)
+
+
+def load_gitignore(pwd):
+    """Returns the simple glob patterns from a directory's .gitignore
+
+    Negated patterns are not supported and are skipped.
+    """
+
+    try:
+        with open(os.path.join(pwd, '.gitignore'), 'r') as file:
+            lines = [l.strip() for l in file]
+    except OSError:
+        return []
+
+    return [l for l in lines if l and not l.startswith(('#', '!'))]
+
+
+def _is_ignored(name, rel_path, is_dir, patterns):
+    for pat in patterns:
+        if pat.endswith('/'):
+            if not is_dir:
+                continue
+            pat = pat.rstrip('/')
+
+        if pat.startswith('/') or '/' in pat:
+            # Anchored to the project root
+            if fnmatch.fnmatch(rel_path, pat.lstrip('/')):
+                return True
+        elif fnmatch.fnmatch(name, pat):
+            return True
+
+    return False
 
 
 class PackageManager:
-    # regex pattern for an import line
-    import_pattern = '(^from [^.][^\s]+ import .+)|(^import [^.].+( as .+)?)'
-    package_pattern = '((?<=^import )[^\s.]+)|((?<=^from )[^\s.]+)'
+    # directories and files never scanned for imports
+    ignore_patterns = [
+        '.git/',
+        '.hg/',
+        '.svn/',
+        '__pycache__/',
+        'venv/',
+        '.venv/',
+        'env/',
+        'node_modules/',
+        '.tox/',
+        '.mypy_cache/',
+        '.pytest_cache/',
+        'site-packages/',
+    ]
+
+    # below this many uncached files, parse inline instead of in a pool
+    parallel_threshold = 64
+
+    # per-project overrides of the module to distribution mapping
+    package_map_file = 'spruce_packages.txt'
 
-    def __init__(self, pwd = '.'):
+    def __init__(
+        self,
+        pwd = '.',
+        use_cache = True,
+        workers = None,
+        executor = 'thread',
+        ignore = None,
+        use_gitignore = True,
+        package_map = None
+    ):
+        """Discovers and installs the packages a project imports
+
+        Args:
+            pwd (str, optional): the project directory to scan
+            use_cache (bool, optional): reuse parsed imports of unchanged files
+            workers (int, optional): parser pool size; defaults to the CPU count
+            executor (str, optional): 'thread' or 'process' parser pool;
+                processes are started by a forkserver, never forked from
+                the (threaded) caller, and re-import its __main__ module
+            ignore (list, optional): extra gitignore-style patterns to skip
+            use_gitignore (bool, optional): also skip the project's .gitignore patterns
+            package_map (dict, optional): module to distribution overrides; None skips a module
+        """
         self.pwd = pwd
+        self.use_cache = use_cache
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+
+        self.ignore = self.ignore_patterns + list(ignore or [])
+        if use_gitignore:
+            self.ignore += load_gitignore(self.pwd)
+
+        self.package_overrides = package_map or {}
+        self._package_map = None
 
         self.requirements = os.path.join(self.pwd, 'requirements.txt')
         self.has_requirements = self._check_requirements()
@@ -27,14 +383,51 @@ class PackageManager:
 
     def _get_scripts(self):
         scripts = []
-        for path, dirs, files in os.walk(self.pwd):
-            scripts = scripts + [os.path.join(path, f) for f in files if re.search('.py$', f)]
+        stack = [self.pwd]
+
+        while stack:
+            path = stack.pop()
+
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                rel_path = os.path.relpath(entry.path, self.pwd)
+                if _is_ignored(entry.name, rel_path, is_dir, self.ignore):
+                    continue
+
+                if is_dir:
+                    stack.append(entry.path)
+                elif entry.name.endswith('.py'):
+                    scripts.append(entry.path)
 
-        return scripts
+        return sorted(scripts)
 
     def _get_script_names(self):
         return [self._get_fn_from_path(fp) for fp in self.script_paths]
 
+    def _get_local_modules(self):
+        """Top-level directories of the project, which its scripts can
+        import as packages of their own
+        """
+
+        try:
+            entries = list(os.scandir(self.pwd))
+        except OSError:
+            return []
+
+        return [
+            e.name for e in entries
+            if e.name.isidentifier() and e.is_dir(follow_symlinks=False)
+        ]
+
     def _check_requirements(self):
         return os.path.exists(self.requirements)
 
@@ -62,16 +455,65 @@ class PackageManager:
 
         subprocess.run(['pip', 'install', package])
 
-    def _is_import_line(self, line):
-        return re.search(self.import_pattern, line) is not None
+    @property
+    def package_map(self):
+        """Module to distribution names, from installed metadata, the
+        curated aliases, the project's map file and explicit overrides
+        """
+
+        if self._package_map is None:
+            mapping = dict(distribution_map())
+            mapping.update(package_aliases)
+            mapping.update(load_package_map(os.path.join(self.pwd, self.package_map_file)))
+            mapping.update(self.package_overrides)
+
+            self._package_map = mapping
+
+        return self._package_map
+
+    def distribution_name(self, module):
+        if module in self.package_map:
+            return self.package_map[module]
+
+        return self._check_package_name(module)
+
+    def _install_batch(self, packages):
+        """Installs all packages with a single pip invocation, falling back
+        to one at a time if the batch fails
+        """
 
-    def _extract_packages(self, line):
-        if re.search(self.package_pattern, line):
-            packages = re.search(self.package_pattern, line).group(0)
+        dists = list(dict.fromkeys(self.distribution_name(p) for p in packages))
 
-            return [p.strip() for p in packages.split(',')]
+        print(f'Installing {", ".join(dists)}')
+
+        res = subprocess.run(['pip', 'install'] + dists)
+
+        if res.returncode != 0 and len(dists) > 1:
+            invalidate_installed()
+
+            for p in dict.fromkeys(self.distribution_name(p) for p in self._check_package_install()):
+                self._install_package(p)
+
+        invalidate_installed()
+
+    def _parse_scripts(self, paths):
+        if self.workers <= 1 or len(paths) < self.parallel_threshold:
+            return [extract_imports(p) for p in paths]
+
+        chunksize = max(1, len(paths) // (self.workers * 4))
+
+        if self.executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=self.workers)
         else:
-            raise Exception(f'Not an import statement: {line}')
+            # The runner's heartbeat and capture threads, or the worker
+            # daemon's, may hold locks that a forked child would inherit
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('forkserver')
+            )
+
+        with pool:
+            return list(pool.map(extract_imports, paths, chunksize=chunksize))
 
     def _get_packages(self):
         # TODO: Only do this if guaranteed that self.has_requirements
@@ -79,25 +521,60 @@ class PackageManager:
         # if self.has_requirements:
         #     return
 
-        packages = []
+        cache = ImportCache(self.pwd) if self.use_cache else None
+
+        by_path = {}
         for s in self.script_paths:
-            with open(s, 'r') as file:
-                for curline in file:
-                    line = curline.strip()
+            by_path[s] = cache.get(s) if cache is not None else None
+
+        todo = [s for s, imports in by_path.items() if imports is None]
+        for s, imports in zip(todo, self._parse_scripts(todo)):
+            by_path[s] = imports
+
+            if cache is not None:
+                cache.set(s, imports)
+
+        found = {}
+        for imports in by_path.values():
+            found.update(dict.fromkeys(imports))
+
+        if cache is not None:
+            cache.save(keep=self.script_paths)
+
+        excluded = set(ineligible_packages) | set(self.script_names) | set(self._get_local_modules())
+
+        return [p for p in found if p not in excluded]
+
+    def fingerprint(self):
+        """Hashes the project's imports together with the interpreter
+        and the state of its sys.path directories
+        """
 
-                    if self._is_import_line(line):
-                        ps = self._extract_packages(line)
+        state = [sys.executable, sorted(self.packages), _path_stamps()]
 
-                        for p in ps:
-                            if p not in packages and len(p) > 0 and p not in ineligible_packages and p not in self.script_names:
-                                packages.append(p)
+        return hashlib.sha1(json.dumps(state).encode()).hexdigest()
 
-        return packages
+    def required_distributions(self):
+        """Returns the sorted distribution names for every third-party
+        module the project imports, installed or not
+        """
+
+        stdlib = stdlib_modules()
+
+        dists = {
+            self.distribution_name(p) for p in self.packages
+            if p not in stdlib
+        }
+
+        return sorted(d for d in dists if d)
 
     def _check_package_install(self):
-        importable = [m.name for m in pkgutil.iter_modules()] + list(sys.builtin_module_names)
+        importable = installed_modules()
 
-        need_install = list(set(self.packages) - set(importable))
+        need_install = [
+            p for p in self.packages
+            if p not in importable and self.distribution_name(p)
+        ]
 
         return need_install
 
@@ -107,7 +584,17 @@ class PackageManager:
         #     self._install_requirements()
         # else:
 
+        satisfied = SatisfiedCache() if self.use_cache else None
+
+        if satisfied is not None and satisfied.get(self.pwd) == self.fingerprint():
+            return []
+
         need_install = self._check_package_install()
 
-        for n in need_install:
-            self._install_package(n)
+        if need_install:
+            self._install_batch(need_install)
+
+        if satisfied is not None and not self._check_package_install():
+            satisfied.set(self.pwd, self.fingerprint())
+
+        return need_install
@@ -0,0 +1,137 @@
+import time
+import threading
+import psutil
+
+DEFAULT_INTERVAL = 5
+
+
+class ResourceSampler:
+    def __init__(self, pid, interval=DEFAULT_INTERVAL, keep_series=False):
+        """Samples resource usage of a process tree on a background thread
+
+        CPU time and I/O bytes are tracked per process, so work done by
+        children that exit between samples is still counted up to their
+        last sample.
+
+        Args:
+            pid (int): PID of the root process of the job
+            interval (float, optional): seconds between samples
+            keep_series (bool, optional): keep every sample, not just the summary
+        """
+        self.pid = pid
+        self.interval = interval
+        self.keep_series = keep_series
+
+        self.series = []
+        self.samples = 0
+        self.peak_rss = 0
+        self.last_rss = 0
+        self.max_threads = 0
+        self.max_children = 0
+
+        self._cpu = {}
+        self._read = {}
+        self._write = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _tree(self):
+        try:
+            root = psutil.Process(self.pid)
+        except psutil.NoSuchProcess:
+            return []
+
+        try:
+            return [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return [root]
+
+    def sample(self):
+        """Takes one sample of the process tree
+
+        Returns:
+            dict: the sample, or None if the process has exited
+        """
+
+        procs = self._tree()
+
+        if not procs:
+            return None
+
+        rss = 0
+        threads = 0
+
+        with self._lock:
+            for p in procs:
+                try:
+                    with p.oneshot():
+                        cpu = p.cpu_times()
+                        rss += p.memory_info().rss
+                        threads += p.num_threads()
+
+                        self._cpu[p.pid] = cpu.user + cpu.system
+
+                        if hasattr(p, 'io_counters'):
+                            io = p.io_counters()
+                            self._read[p.pid] = io.read_bytes
+                            self._write[p.pid] = io.write_bytes
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+
+            self.samples += 1
+            self.last_rss = rss
+            self.peak_rss = max(self.peak_rss, rss)
+            self.max_threads = max(self.max_threads, threads)
+            self.max_children = max(self.max_children, len(procs) - 1)
+
+            point = dict(
+                time=time.time(),
+                cpu_seconds=round(sum(self._cpu.values()), 3),
+                rss=rss,
+                threads=threads,
+                children=len(procs) - 1,
+            )
+
+            if self.keep_series:
+                self.series.append(point)
+
+        return point
+
+    def summary(self):
+        with self._lock:
+            summary = dict(
+                samples=self.samples,
+                cpu_seconds=round(sum(self._cpu.values()), 3),
+                peak_rss=self.peak_rss,
+                last_rss=self.last_rss,
+                io_read_bytes=sum(self._read.values()),
+                io_write_bytes=sum(self._write.values()),
+                max_threads=self.max_threads,
+                max_children=self.max_children,
+            )
+
+            if self.keep_series:
+                summary['series'] = list(self.series)
+
+        return summary
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.sample() is None:
+                break
+
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(
+            name='resources_{}'.format(self.pid), target=self._loop, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
@@ -2,22 +2,28 @@
 import subprocess
 from subprocess import PIPE
 from subprocess import CompletedProcess
-import threading
 import time
 import os
-import requests
+import json
+import signal
+import traceback
+from . import client
 import click
 from urllib.parse import urljoin
 from datetime import datetime, timezone
-import pytz
+from contextlib import ExitStack
 from .constants import api_url, app_url
 import psutil
 
 import warnings
 
-from .notifier import Email, get_recipient_emails, get_recipients
-from .secrets import get_secret_by_key
+from .secrets import get_secrets_by_keys
 from .packagemanager import PackageManager
+from .venvmanager import VenvManager
+from .heartbeat import Heartbeat
+from .resources import ResourceSampler, DEFAULT_INTERVAL
+from .capture import capture_process, DEFAULT_BUFFER_BYTES
+from .admission import SlotPool, MAX_RUNS, DEFAULT_PRIORITY
 
 run_ept = 'runs'
 recipient_ept = 'recipients'
@@ -26,12 +32,29 @@ task_secret_ept = 'task_secrets'
 
 DEFAULT_USER = 1
 
+TIMEOUT_CODE = 420
+MEMORY_LIMIT_CODE = 421
+CPU_LIMIT_CODE = 422
+
 RETURN_CODES = {
     0: 'success',
     -9: 'killed',
-    420: 'timeout',
+    TIMEOUT_CODE: 'timeout',
+    MEMORY_LIMIT_CODE: 'memory limit',
+    CPU_LIMIT_CODE: 'cpu limit',
+}
+
+# statuses that alert the task's error recipients
+NOTIFY_STATUSES = {
+    'fail',
+    RETURN_CODES[TIMEOUT_CODE],
+    RETURN_CODES[MEMORY_LIMIT_CODE],
+    RETURN_CODES[CPU_LIMIT_CODE],
 }
 
+# seconds between limit checks while a script runs
+LIMIT_POLL = 1
+
 
 def send_timeout(run_id):
     ept = urljoin(api_url, run_ept) + '/' + run_id.__str__()
@@ -44,7 +67,25 @@ def send_timeout(run_id):
         pid=-1,
     )
 
-    requests.patch(ept, data=payload)
+    client.patch(ept, data=payload)
+
+
+def kill_tree(proc_pid):
+    """Kills a process and all of its children
+
+    Args:
+        proc_pid (int): PID of the root process to kill
+    """
+
+    process = psutil.Process(proc_pid)
+
+    for proc in process.children(recursive=True):
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+    process.kill()
 
 
 def kill(proc_pid, run_id):
@@ -60,12 +101,7 @@ def kill(proc_pid, run_id):
         return
 
     try:
-        process = psutil.Process(proc_pid)
-
-        for proc in process.children(recursive=True):
-            proc.kill()
-
-        process.kill()
+        kill_tree(proc_pid)
     except psutil.NoSuchProcess:
         send_timeout(run_id)
 
@@ -78,6 +114,16 @@ class Runner:
             user: the user id of the user who is executing the task (will be passed to API)
             start_dir: the directory where the target file should be executed
             script_args: the arguments to be passed to the target file
+            capture_bytes: max bytes of stdout / stderr kept in memory
+            spool_dir: optional directory to write the full output to
+            isolated_env: run in a cached virtualenv built for the task's dependencies
+            sample_interval: seconds between resource usage samples (0 disables)
+            sample_series: attach every resource sample, not just the summary
+            max_runtime: wall-clock seconds before the script is killed
+            max_rss: bytes of resident memory the script's process tree may use
+            max_cpu: CPU seconds the script's process tree may use
+            max_concurrent: runs allowed at once on this host (0 disables the queue)
+            priority: 0-999 queue priority, higher is admitted first
         """
         self.target = kwargs.get('target')
         self.task_id = kwargs.get('task_id')
@@ -89,16 +135,32 @@ class Runner:
         self.test_run = kwargs.get('test_run', False)
         self.status_running = False
         self.hostname = kwargs.get('app_hostname', app_url)
+        self.capture_bytes = kwargs.get('capture_bytes', DEFAULT_BUFFER_BYTES)
+        self.spool_dir = kwargs.get('spool_dir')
+        self.isolated_env = kwargs.get('isolated_env', False)
+        self.python_path = None
+        self.sample_interval = kwargs.get('sample_interval', DEFAULT_INTERVAL)
+        self.sample_series = kwargs.get('sample_series', False)
+        self.max_runtime = kwargs.get('max_runtime')
+        self.max_rss = kwargs.get('max_rss')
+        self.max_cpu = kwargs.get('max_cpu')
+        self.max_concurrent = kwargs.get('max_concurrent', MAX_RUNS)
+        self.priority = kwargs.get('priority', DEFAULT_PRIORITY)
 
         # To avoid missing attribut errors
         self.stderr = None
         self.stdout = None
+        self.captures = None
+        self.beat = None
+        self.completed = False
+        self.env_failed = []
+        self.sampler = None
 
         self.valid = os.path.exists(os.path.join(self.start_dir, self.target))
 
         # TODO: hit Spruce endpoint to get env_vars
         ept = urljoin(api_url, task_secret_ept)
-        res = requests.get(ept + '/' + str(self.task_id))
+        res = client.get(ept + '/' + str(self.task_id))
 
         if res.status_code == 200:
             self.env_vars = {d['alias']: d['secret_key'] for d in res.json()}
@@ -112,20 +174,30 @@ class Runner:
     def validate_path(self, path, target):
         pass
 
-    def heartbeat(self, frequency=10):
-        """Sends a heartbeat while running
-
-        Args:
-            frequency (int, optional): [description]. Defaults to 10.
+    def _output_tail(self):
+        """Returns the live output tail once the script is running
         """
 
-        ept = urljoin(api_url, run_ept) + '/' + self.run_id.__str__()
-        while self.status_running == True:
-            payload = dict(
-                heartbeat=datetime.now(timezone.utc)
-            )
-            requests.patch(ept, data=payload)
-            time.sleep(frequency)
+        if self.captures is None:
+            return {}
+
+        stdout, stderr = self.captures
+
+        return dict(
+            output_text=stdout.tail(),
+            error_text=stderr.tail()
+        )
+
+    def _resource_usage(self, series=False):
+        if self.sampler is None:
+            return {}
+
+        summary = self.sampler.summary()
+
+        if not series:
+            summary.pop('series', None)
+
+        return dict(resource_usage=json.dumps(summary))
 
     def start_heartbeat(self, frequency=10):
         """Send a heartbeat to the API
@@ -134,18 +206,97 @@ class Runner:
             frequency (int, optional): number of seconds between heartbeats. Defaults to 10.
         """
 
-        sub_env = os.environ.copy()
-        sub_env['TASK_ID'] = self.task_id.__str__()
-        sub_env['RUN_ID'] = self.run_id.__str__()
+        ept = urljoin(api_url, run_ept) + '/' + self.run_id.__str__()
 
-        threadname = 'heartbeat_run_{}'.format(self.run_id.__str__())
-        thread = threading.Thread(
-            name=threadname, target=self.heartbeat)
-        thread.start()
+        self.beat = Heartbeat(
+            ept,
+            frequency=frequency,
+            name='heartbeat_run_{}'.format(self.run_id.__str__())
+        )
+        self.beat.add_provider(self._output_tail)
+        self.beat.add_provider(self._resource_usage)
+        self.beat.start()
+
+    def stop_heartbeat(self):
+        self.status_running = False
+
+        if self.beat is not None:
+            self.beat.stop()
 
     def _get_python_path(self):
+        if self.python_path:
+            return self.python_path
+
         return '/usr/local/bin/python3.9'
 
+    def _limit_exceeded(self, elapsed):
+        """Returns the return code and message of the first limit the
+        running script has exceeded, or None
+        """
+
+        if self.max_runtime and elapsed > self.max_runtime:
+            return TIMEOUT_CODE, f'Run exceeded the max runtime of {self.max_runtime}s'
+
+        if self.max_rss or self.max_cpu:
+            usage = self.sampler.sample() or {}
+
+            if self.max_rss and usage.get('rss', 0) > self.max_rss:
+                return MEMORY_LIMIT_CODE, f'Run exceeded the memory limit of {self.max_rss} bytes'
+
+            if self.max_cpu and usage.get('cpu_seconds', 0) > self.max_cpu:
+                return CPU_LIMIT_CODE, f'Run exceeded the CPU limit of {self.max_cpu}s'
+
+        return None
+
+    def _wait(self, proc):
+        """Waits for the script to finish, killing its process tree if it
+        exceeds any of the run limits
+
+        Returns:
+            tuple: (return code, message) of the limit hit, or None
+        """
+
+        if not (self.max_runtime or self.max_rss or self.max_cpu):
+            proc.wait()
+            return None
+
+        start = time.monotonic()
+
+        while True:
+            try:
+                proc.wait(timeout=LIMIT_POLL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+
+            exceeded = self._limit_exceeded(time.monotonic() - start)
+
+            if exceeded:
+                try:
+                    kill_tree(proc.pid)
+                except psutil.NoSuchProcess:
+                    pass
+
+                proc.wait()
+                return exceeded
+
+        # The rlimit backstop delivers SIGXCPU to a process over max_cpu
+        if self.max_cpu and proc.returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            return CPU_LIMIT_CODE, f'Run exceeded the CPU limit of {self.max_cpu}s'
+
+        return None
+
+    def _command(self, interpreter, full_target):
+        command = 'cd {} && {} {}'.format(self.start_dir, interpreter, full_target)
+
+        if self.max_cpu:
+            # Per-process CPU rlimit as a backstop to the tree-wide check.
+            # Only the soft limit is set, so the kernel sends SIGXCPU,
+            # which _wait reports as the CPU limit, rather than SIGKILL
+            command = 'ulimit -S -t {} && {}'.format(int(self.max_cpu) + 1, command)
+
+        return command
+
     def custom_error(self, returncode, error):
         return CompletedProcess(args=[], returncode=returncode, stderr=error)
 
@@ -169,7 +320,7 @@ class Runner:
             script_args=self.script_args,
         )
 
-        r = requests.post(ept, data=data)
+        r = client.post(ept, data=data)
         # set status to running
         self.status_running = True
         self.run_id = r.json()['id']
@@ -184,10 +335,16 @@ class Runner:
         # TODO: change API to query params like Recipients??
         ept = urljoin(api_url, run_ept) + '/' + self.run_id.__str__()
 
+        self.completed = True
+
         status = RETURN_CODES.get(res.returncode, 'fail')
 
-        if status == 'fail':
-            self.notify_failure(res)
+        if status in NOTIFY_STATUSES:
+            # A broken notification must not keep the run open
+            try:
+                self.notify_failure(res)
+            except Exception:
+                traceback.print_exc()
 
         error = self.stderr
         output = self.stdout
@@ -199,22 +356,21 @@ class Runner:
             output_text=output,
             return_code=res.returncode,
             pid=-1,
+            **self._resource_usage(series=self.sample_series)
         )
-        self.status_running = False
-        requests.patch(ept, data=payload)
+        self.stop_heartbeat()
+        client.patch(ept, data=payload)
 
     def process_id_on_run(self, pid):
-        """Sets the process ID of the run
+        """Sets the process ID of the run with the next heartbeat, which
+        is sent right away
 
         Args:
-            res (CompletedProcess): the CompletedProcess object returned by subprocess.run
+            pid (int): the process ID of the running script
         """
-        ept = urljoin(api_url, run_ept) + '/' + self.run_id.__str__()
 
-        payload = dict(
-            pid=pid
-        )
-        requests.patch(ept, data=payload)
+        self.beat.update(pid=pid)
+        self.beat.poke()
 
     def notify_failure(self, res):
         """In the event of a run failure, retrieves a list of individuals
@@ -222,6 +378,9 @@ class Runner:
         relevant modes (email)
         """
 
+        import pytz
+        from .notifier import Email, get_recipient_emails, get_recipients
+
         recipient_list = get_recipients(self.task_id, 'error')
         emails = get_recipient_emails(recipient_list)
 
@@ -271,10 +430,52 @@ class Runner:
         # POST new run to API
         self.create_run()
 
+        try:
+            if not self.max_concurrent:
+                self._run_script()
+                return
+
+            # Wait for one of the host's run slots
+            with SlotPool(slots=self.max_concurrent).acquire(priority=self.priority) as slot:
+                self.beat.update(queue_seconds=round(slot.queued_seconds, 3))
+
+                self._run_script()
+        except Exception:
+            # Close the run as failed so it doesn't look in progress
+            if not self.completed:
+                self.stderr = f'{self.stderr or ""}\n{traceback.format_exc()}'.lstrip()
+                self.complete_run(self.custom_error(returncode=1, error=self.stderr.encode()))
+            raise
+        finally:
+            # Never leave the heartbeat running, e.g. in the worker daemon
+            self.stop_heartbeat()
+
+    def _run_script(self):
         # Check packages
         p = PackageManager(self.start_dir)
-        p.install_packages()
 
+        with ExitStack() as stack:
+            if self.isolated_env:
+                # The environment is leased for the whole run so it can't
+                # be evicted under the script
+                try:
+                    env = stack.enter_context(VenvManager().lease(
+                        p.required_distributions(),
+                        base_python=self._get_python_path()
+                    ))
+                except RuntimeError as e:
+                    res = self.custom_error(returncode=99, error=str(e).encode())
+                    self.complete_run(res)
+                    return
+
+                self.python_path = env.python
+                self.env_failed = env.failed
+            else:
+                p.install_packages()
+
+            self._execute()
+
+    def _execute(self):
         # Get the interpreter from the file extension
         # TODO: this should work off the config file (see above)
         if self.ext == '.py':
@@ -300,20 +501,57 @@ class Runner:
         sub_env['RUN_ID'] = self.run_id.__str__()
 
         if self.env_vars:
+            secrets = get_secrets_by_keys(self.env_vars.values())
+
             for k, v in self.env_vars.items():
-                sub_env[k] = get_secret_by_key(v)
+                sub_env[k] = secrets[v]
+
+        command = self._command(interpreter, full_target)
 
-        res = subprocess.Popen('cd {} && {} {}'.format(self.start_dir, interpreter, full_target),
-                               stdout=PIPE, stderr=PIPE, shell=True, env=sub_env)
+        res = subprocess.Popen(command, stdout=PIPE, stderr=PIPE, shell=True, env=sub_env)
+
+        # drain both pipes while the script runs so it never blocks on
+        # a full pipe buffer
+        self.captures = capture_process(
+            res,
+            max_bytes=self.capture_bytes,
+            spool_dir=self.spool_dir,
+            prefix='run_{}'.format(self.run_id)
+        )
 
         # set the process ID of the run
         self.process_id_on_run(res.pid)
 
+        if self.sample_interval or self.max_rss or self.max_cpu:
+            self.sampler = ResourceSampler(
+                res.pid,
+                interval=self.sample_interval,
+                keep_series=self.sample_series
+            )
+
+            if self.sample_interval:
+                self.sampler.start()
+
         # wait for the process to finish
-        res.wait()
+        exceeded = self._wait(res)
+
+        if self.sampler is not None:
+            self.sampler.stop()
+
+        for c in self.captures:
+            c.join()
+
+        stdout, stderr = self.captures
+        self.stderr = stderr.tail()
+        self.stdout = stdout.tail()
+
+        if self.env_failed:
+            message = 'Could not install into the task environment: {}'.format(', '.join(self.env_failed))
+            self.stderr = f'{self.stderr}\n{message}'.lstrip()
 
-        self.stderr = res.stderr.read().decode('ascii')
-        self.stdout = res.stdout.read().decode('ascii')
+        if exceeded:
+            res.returncode, message = exceeded
+            self.stderr = f'{self.stderr}\n{message}'.lstrip()
 
         # os.chdir(original_dir)
         self.complete_run(res)
@@ -325,7 +563,19 @@ class Runner:
 @click.argument('user')
 @click.argument('start_dir')
 @click.option('--script_args', default=None)
-def main(target, task_id, user, start_dir, script_args):
+@click.option('--spool_dir', default=None)
+@click.option('--isolated_env', is_flag=True, default=False)
+@click.option('--sample_interval', default=DEFAULT_INTERVAL, type=float)
+@click.option('--max_runtime', default=None, type=float)
+@click.option('--max_rss', default=None, type=int)
+@click.option('--max_cpu', default=None, type=float)
+@click.option('--max_concurrent', default=MAX_RUNS, type=int)
+@click.option('--priority', default=DEFAULT_PRIORITY, type=int)
+def main(
+    target, task_id, user, start_dir, script_args, spool_dir,
+    isolated_env, sample_interval, max_runtime, max_rss, max_cpu,
+    max_concurrent, priority
+):
     """Run an arbitrary task in an arbitrary place and tell Spruce about it
 
     TARGET is the filename (with extension) of the script to run
@@ -333,6 +583,12 @@ def main(target, task_id, user, start_dir, script_args):
     USER is the Spruce user ID who kicked off this run
     START_DIR is the working directory containing the script to run
     SCRIPT_ARGS is a single string with any arguments to pass to the script
+    SPOOL_DIR is an optional directory to write the full script output to
+    ISOLATED_ENV runs the script in a cached virtualenv for its dependencies
+    SAMPLE_INTERVAL is the seconds between resource usage samples (0 disables)
+    MAX_RUNTIME, MAX_RSS and MAX_CPU are optional limits in seconds, bytes and CPU seconds
+    MAX_CONCURRENT is the number of runs allowed at once on this host
+    PRIORITY orders queued runs, higher first
     """
 
     runner = Runner(
@@ -340,7 +596,15 @@ def main(target, task_id, user, start_dir, script_args):
         task_id=task_id,
         user=user,
         start_dir=start_dir,  # start_dir is project directory
-        script_args=script_args
+        script_args=script_args,
+        spool_dir=spool_dir,
+        isolated_env=isolated_env,
+        sample_interval=sample_interval,
+        max_runtime=max_runtime,
+        max_rss=max_rss,
+        max_cpu=max_cpu,
+        max_concurrent=max_concurrent,
+        priority=priority
     )
 
     result = runner.run()
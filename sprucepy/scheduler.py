@@ -41,6 +41,74 @@ def get_current_schedule(
         )
 
 
+def get_next_runs(
+    task_ids,
+    cron_timezone : str = 'UTC',
+    target_timezone : str = 'America/New_York'
+):
+    if system == 'Linux':
+        runs = ls.get_next_runs(
+            [task_name(t) for t in task_ids],
+            cron_timezone=cron_timezone,
+            target_timezone=target_timezone
+        )
+
+        return {t: runs[task_name(t)] for t in task_ids}
+
+
+def get_schedules(
+    task_ids,
+    cron_timezone : str = 'UTC',
+    target_timezone : str = 'America/New_York'
+):
+    if system == 'Linux':
+        schedules = ls.get_current_schedules(
+            [task_name(t) for t in task_ids],
+            cron_timezone=cron_timezone,
+            target_timezone=target_timezone
+        )
+
+        return {t: schedules[task_name(t)] for t in task_ids}
+
+
+def sync_schedules(schedulers, prune : bool = False):
+    """Applies many Scheduler objects in one crontab write
+
+    Args:
+        schedulers (list): Scheduler objects to apply
+        prune (bool, optional): remove Spruce tasks not in schedulers
+    """
+
+    if system == 'Linux':
+        return ls.sync_tasks(
+            [s.linux_spec() for s in schedulers],
+            prune_prefix=task_name('') if prune else None
+        )
+
+
+def rebalance_schedules(schedulers, durations : dict = None):
+    """Moves the given tasks to start times that spread load
+
+    Args:
+        schedulers (list): Scheduler objects to re-place
+        durations (dict, optional): typical run time in seconds by task ID
+    """
+
+    if system == 'Linux':
+        durations = {task_name(k): v for k, v in (durations or {}).items()}
+
+        planned = ls.rebalance(
+            [s.linux_spec() for s in schedulers],
+            durations=durations
+        )
+
+        by_name = {p['name']: p for p in planned}
+        for s in schedulers:
+            s.start_time = by_name[task_name(s.task_id)].get('start')
+
+        return planned
+
+
 class Scheduler:
     def __init__(
         self,
@@ -72,8 +140,8 @@ class Scheduler:
 
         return runner_args
 
-    def linux_scheduler(self):
-        scheduled = ls.create_task(
+    def linux_spec(self):
+        return dict(
             name=task_name(self.task_id),
             task_id=self.task_id,
             frequency=self.frequency,
@@ -81,6 +149,9 @@ class Scheduler:
             interval=self.interval
         )
 
+    def linux_scheduler(self):
+        scheduled = ls.create_task(**self.linux_spec())
+
         return scheduled
 
     def windows_scheduler(self):
@@ -91,7 +162,35 @@ class Scheduler:
         print('Mac not implemented!')
         return False
 
-    def schedule(self):
+    def spread_start(self, durations : dict = None):
+        """Picks a start time that overlaps the fewest scheduled runs
+
+        Args:
+            durations (dict, optional): typical run time in seconds by task ID
+        """
+
+        durations = durations or {}
+
+        return ls.plan_start(
+            self.frequency,
+            interval=self.interval,
+            duration=durations.get(self.task_id, ls.DEFAULT_DURATION),
+            durations={task_name(k): v for k, v in durations.items()},
+            exclude=[task_name(self.task_id)]
+        )
+
+    def schedule(self, spread : bool = False, durations : dict = None):
+        """Schedules the task with the OS scheduler
+
+        Args:
+            spread (bool, optional): place a task without a start time where
+                it overlaps the fewest scheduled runs
+            durations (dict, optional): typical run time in seconds by task ID
+        """
+
+        if spread and self.start_time is None and system == 'Linux':
+            self.start_time = self.spread_start(durations)
+
         if system == 'Windows':
             self.windows_scheduler()
         elif system == 'Linux':
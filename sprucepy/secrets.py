@@ -1,12 +1,88 @@
-import requests
+from . import client
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .constants import api_url
 
+# Seconds to keep resolved secrets in memory; 0 disables the cache
+SECRET_CACHE_TTL = float(os.getenv('SPRUCE_SECRET_CACHE_TTL', 0))
+MAX_WORKERS = 8
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache_key):
+    with _cache_lock:
+        hit = _cache.get(cache_key)
+
+        if hit is None:
+            return None
+
+        value, expires = hit
+        if expires < time.monotonic():
+            del _cache[cache_key]
+            return None
+
+        return value
+
+
+def _cache_set(cache_key, value, ttl):
+    if ttl <= 0:
+        return
+
+    with _cache_lock:
+        _cache[cache_key] = (value, time.monotonic() + ttl)
+
+
+def invalidate(key=None, api_url : str = api_url):
+    """Drop cached secrets
+
+    Args:
+        key
+            str : the key to drop; all keys are dropped when None
+        api_url
+            str : the root url the key was resolved against
+    """
+
+    with _cache_lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop((api_url, str(key)), None)
+
+
+def _fetch_secret(key, api_url, headers):
+    res = client.get(
+        api_url + "secrets/" + str(key),
+        headers=headers
+    )
+
+    if res.status_code == 200:
+        return res.json()['value']
+    else:
+        if res.status_code == 404:
+            raise IndexError(key)
+        elif res.status_code == 401:
+            raise PermissionError(res.json()['detail'])
+        else:
+            raise Exception(res.text)
+
+
+def _auth_headers(api_token):
+    auth_token = os.getenv('SPRUCE_API_TOKEN', api_token)
+
+    return {
+        'Authorization': f'Token {auth_token}'
+    }
+
 
 def get_secret_by_key(
     key,
     api_url : str = api_url,
-    api_token : str = ''
+    api_token : str = '',
+    ttl : float = None
 ):
     """Retrieve a secret from the key vault
 
@@ -17,29 +93,84 @@ def get_secret_by_key(
             str : the root url for the Spruce API
         api_token
             str : auth token for the Spruce API
+        ttl
+            float : seconds to cache the value; defaults to SECRET_CACHE_TTL
 
     Returns:
         str
             the secret value
     """
 
-    auth_token = os.getenv('SPRUCE_API_TOKEN', api_token)
+    if ttl is None:
+        ttl = SECRET_CACHE_TTL
 
-    headers = {
-        'Authorization': f'Token {auth_token}'
-    }
+    cache_key = (api_url, str(key))
+    value = _cache_get(cache_key)
 
-    res = requests.get(
-        api_url + "secrets/" + str(key),
-        headers=headers
-    )
+    if value is None:
+        value = _fetch_secret(key, api_url, _auth_headers(api_token))
+        _cache_set(cache_key, value, ttl)
 
-    if res.status_code == 200:
-        return res.json()['value']
-    else:
-        if res.status_code == 404:
-            raise IndexError(key)
-        elif res.status_code == 401:
-            raise PermissionError(res.json()['detail'])
+    return value
+
+
+def get_secrets_by_keys(
+    keys,
+    api_url : str = api_url,
+    api_token : str = '',
+    ttl : float = None,
+    max_workers : int = MAX_WORKERS
+):
+    """Retrieve many secrets from the key vault at once
+
+    Cached keys are served from memory and the rest are fetched
+    concurrently over the shared connection pool.
+
+    Args:
+        keys
+            iterable : the keys for the secrets to retrieve
+        api_url
+            str : the root url for the Spruce API
+        api_token
+            str : auth token for the Spruce API
+        ttl
+            float : seconds to cache the values; defaults to SECRET_CACHE_TTL
+        max_workers
+            int : max number of concurrent requests
+
+    Returns:
+        dict
+            the secret values by key
+    """
+
+    if ttl is None:
+        ttl = SECRET_CACHE_TTL
+
+    secrets = {}
+    missing = []
+
+    for key in dict.fromkeys(keys):
+        value = _cache_get((api_url, str(key)))
+
+        if value is None:
+            missing.append(key)
         else:
-            raise Exception(res.text)
+            secrets[key] = value
+
+    if not missing:
+        return secrets
+
+    headers = _auth_headers(api_token)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+        futures = {
+            key: pool.submit(_fetch_secret, key, api_url, headers)
+            for key in missing
+        }
+
+    # Raises the first error in key order, like repeated single lookups
+    for key, future in futures.items():
+        secrets[key] = future.result()
+        _cache_set((api_url, str(key)), secrets[key], ttl)
+
+    return secrets
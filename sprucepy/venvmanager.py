@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import json
+import shutil
+import fcntl
+import hashlib
+import subprocess
+from collections import namedtuple
+from contextlib import contextmanager
+from .constants import cache_dir
+
+MAX_ENVS = int(os.getenv('SPRUCE_MAX_VENVS', 20))
+# Seconds before distributions that failed to install are tried again
+RETRY_FAILED = int(os.getenv('SPRUCE_VENV_RETRY_FAILED', 3600))
+
+# A leased environment and the distributions that could not be installed
+Env = namedtuple('Env', ['python', 'failed'])
+
+
+@contextmanager
+def _locked(path, blocking=True):
+    """Holds an exclusive flock on path for the duration of the block
+
+    Yields False without waiting if blocking is False and the lock is busy.
+    """
+
+    with open(path, 'a') as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class VenvManager:
+    ready_marker = '.spruce_ready'
+
+    def __init__(self, root=None, max_envs=MAX_ENVS, retry_failed=RETRY_FAILED):
+        """Builds and reuses virtual environments keyed by dependency set
+
+        Environments are created with access to the base interpreter's
+        site-packages, so only a task's extra dependencies are installed
+        into them. The least recently used environments are removed once
+        there are more than max_envs.
+
+        Args:
+            root (str, optional): directory holding the environments
+            max_envs (int, optional): number of environments to keep
+            retry_failed (int, optional): seconds before distributions
+                that failed to install are tried again
+        """
+        self.root = root or os.path.join(cache_dir, 'venvs')
+        self.max_envs = max_envs
+        self.retry_failed = retry_failed
+
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def env_key(distributions, base_python):
+        state = [base_python, sorted(set(distributions))]
+
+        return hashlib.sha1(json.dumps(state).encode()).hexdigest()[:16]
+
+    def _env_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _lock_path(self, key):
+        return os.path.join(self.root, f'{key}.lock')
+
+    @staticmethod
+    def _python(env_path):
+        return os.path.join(env_path, 'bin', 'python')
+
+    def _is_ready(self, env_path):
+        return os.path.exists(os.path.join(env_path, self.ready_marker))
+
+    def _touch(self, env_path):
+        os.utime(os.path.join(env_path, self.ready_marker))
+
+    def _read_marker(self, env_path):
+        try:
+            with open(os.path.join(env_path, self.ready_marker)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_marker(self, env_path, distributions, failed):
+        with open(os.path.join(env_path, self.ready_marker), 'w') as file:
+            json.dump(dict(
+                distributions=list(distributions),
+                failed=list(failed),
+                built=time.time()
+            ), file)
+
+    @staticmethod
+    def _install(python, distributions):
+        """Installs in one pip call, falling back to one at a time
+
+        Returns:
+            list: the distributions that could not be installed
+        """
+
+        res = subprocess.run([python, '-m', 'pip', 'install'] + list(distributions))
+
+        if res.returncode == 0:
+            return []
+
+        return [
+            d for d in distributions
+            if subprocess.run([python, '-m', 'pip', 'install', d]).returncode != 0
+        ]
+
+    def _build(self, env_path, distributions, base_python):
+        if os.path.exists(env_path):
+            # Left over from an interrupted build
+            shutil.rmtree(env_path, ignore_errors=True)
+
+        print(f'Building environment {env_path}')
+
+        res = subprocess.run([base_python, '-m', 'venv', '--system-site-packages', env_path])
+
+        if res.returncode != 0:
+            shutil.rmtree(env_path, ignore_errors=True)
+            raise RuntimeError(f'Could not create environment {env_path}')
+
+        # Imports that fail to install are often optional or for another
+        # platform, so the environment is kept with what did install and
+        # the failures are recorded to be reported and retried
+        failed = self._install(self._python(env_path), distributions) if distributions else []
+
+        self._write_marker(env_path, distributions, failed)
+
+    def _retry(self, env_path):
+        marker = self._read_marker(env_path)
+        failed = marker.get('failed', [])
+
+        if failed and time.time() - marker.get('built', 0) > self.retry_failed:
+            failed = self._install(self._python(env_path), failed)
+            self._write_marker(env_path, marker.get('distributions', []), failed)
+
+        return failed
+
+    @contextmanager
+    def lease(self, distributions, base_python=None):
+        """Yields the interpreter of an environment with the distributions
+        installed, building it on first use
+
+        The environment is held with a shared lock until the block exits,
+        so it can't be evicted while a run is using it.
+
+        Args:
+            distributions (list): distribution names to install
+            base_python (str, optional): interpreter to base the environment on
+
+        Yields:
+            Env: the environment's python executable and the distributions
+                that could not be installed into it
+
+        Raises:
+            RuntimeError: if the environment could not be created
+        """
+
+        base_python = base_python or sys.executable
+        key = self.env_key(distributions, base_python)
+        env_path = self._env_path(key)
+
+        with open(self._lock_path(key), 'a') as lock_file:
+            while True:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                try:
+                    if not self._is_ready(env_path):
+                        self._build(env_path, distributions, base_python)
+
+                    failed = self._retry(env_path)
+                except BaseException:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    raise
+
+                self._touch(env_path)
+
+                # Downgrading isn't atomic, so make sure evict() didn't
+                # take the environment in between
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+
+                if self._is_ready(env_path):
+                    break
+
+            try:
+                self.evict()
+
+                yield Env(self._python(env_path), failed)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self):
+        """Removes least recently used environments over the cap, skipping
+        any that are being built or used by a run right now
+        """
+
+        envs = []
+        for entry in os.scandir(self.root):
+            marker = os.path.join(entry.path, self.ready_marker)
+
+            if entry.is_dir() and os.path.exists(marker):
+                envs.append((os.path.getmtime(marker), entry.name))
+
+        envs.sort(reverse=True)
+
+        for _, key in envs[self.max_envs:]:
+            with _locked(self._lock_path(key), blocking=False) as acquired:
+                if acquired:
+                    # The lock file stays so waiters never split onto a new inode
+                    shutil.rmtree(self._env_path(key), ignore_errors=True)
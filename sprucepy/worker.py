@@ -0,0 +1,123 @@
+import os
+import json
+import socketserver
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import click
+
+from .constants import worker_socket
+from .api import run_from_api
+from .runner import Runner, MAX_RUNS
+
+# keys a request must carry, by action
+REQUIRED = {
+    'execute': ('task_id',),
+    'run': ('target', 'task_id'),
+}
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line, queues it and replies right away
+
+    Requests:
+        {"action": "execute", "task_id": ...}
+            asks the Spruce API to execute a task, as sprucepy.api does
+        {"action": "run", "target": ..., "task_id": ..., ...}
+            runs a script with Runner using the remaining keys as kwargs
+        {"action": "ping"}
+    """
+
+    def _reply(self, **fields):
+        self.wfile.write((json.dumps(fields) + '\n').encode())
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            action = request.pop('action')
+        except (ValueError, KeyError, AttributeError) as e:
+            self._reply(ok=False, error=f'Bad request: {e}')
+            return
+
+        missing = [k for k in REQUIRED.get(action, ()) if request.get(k) in (None, '')]
+
+        if missing:
+            self._reply(ok=False, error='Bad request: missing {}'.format(', '.join(missing)))
+            return
+
+        if action == 'ping':
+            self._reply(ok=True, pid=os.getpid())
+        elif action == 'execute':
+            self.server.submit(run_from_api, request['task_id'])
+            self._reply(ok=True)
+        elif action == 'run':
+            self.server.submit(lambda: Runner(**request).run())
+            self._reply(ok=True)
+        else:
+            self._reply(ok=False, error=f'Unknown action: {action}')
+
+
+class WorkerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path=worker_socket, max_workers=MAX_RUNS):
+        """Warm sprucepy process that launches runs sent over a Unix socket
+
+        Args:
+            socket_path (str, optional): path of the socket to listen on
+            max_workers (int, optional): requests handled at once
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+        self.socket_path = socket_path
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+        # Bind with a restrictive umask so the socket is never
+        # connectable by other users, not even briefly
+        umask = os.umask(0o177)
+
+        try:
+            super().__init__(socket_path, WorkerHandler)
+        finally:
+            os.umask(umask)
+
+    def submit(self, fn, *args):
+        def call():
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+
+        return self.pool.submit(call)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+@click.command()
+@click.option('--socket', 'socket_path', default=worker_socket)
+@click.option('--max_workers', default=MAX_RUNS, type=int)
+def main(socket_path, max_workers):
+    """Run the sprucepy worker daemon
+
+    SOCKET is the Unix socket to listen on
+    MAX_WORKERS is the number of requests handled at once
+    """
+
+    with WorkerServer(socket_path, max_workers) as server:
+        print(f'sprucepy worker listening on {socket_path}')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
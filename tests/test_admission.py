@@ -0,0 +1,58 @@
+import os
+import fcntl
+
+import pytest
+
+from sprucepy.admission import SlotPool
+
+
+def _pool(tmp_path, slots=2):
+    return SlotPool(slots=slots, directory=str(tmp_path), poll=0.01)
+
+
+def test_stale_ticket_is_cleared(tmp_path):
+    pool = _pool(tmp_path)
+
+    # Left by a killed waiter whose PID is now in use by another process
+    stale = os.path.join(pool.queue_dir, f'000-{0:020d}-1')
+    open(stale, 'w').close()
+
+    with pool.acquire(timeout=1) as slot:
+        assert slot.index == 0
+
+    assert not os.path.exists(stale)
+    assert pool.queue_length() == 0
+
+
+def test_unparseable_ticket_is_skipped(tmp_path):
+    pool = _pool(tmp_path)
+
+    open(os.path.join(pool.queue_dir, 'not-a-ticket'), 'w').close()
+
+    with pool.acquire(timeout=1):
+        pass
+
+
+def test_live_ticket_keeps_its_place(tmp_path):
+    pool = _pool(tmp_path)
+
+    # Another waiter ahead in the queue, holding its ticket lock
+    path = os.path.join(pool.queue_dir, f'000-{0:020d}-1')
+    with open(path, 'w') as ticket_file:
+        fcntl.flock(ticket_file, fcntl.LOCK_EX)
+
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.1)
+
+    assert os.path.exists(path)
+
+
+def test_slots_are_limited(tmp_path):
+    pool = _pool(tmp_path, slots=1)
+
+    with pool.acquire(timeout=1):
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.1)
+
+    with pool.acquire(timeout=1):
+        pass
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+
+from sprucepy.crontz import offset_minutes, parse_field, render_field, translate, _translate
+
+
+@pytest.mark.parametrize('field, lo, hi, expected', [
+    ('*', 0, 6, [0, 1, 2, 3, 4, 5, 6]),
+    ('*/15', 0, 59, [0, 15, 30, 45]),
+    ('1-10/3', 0, 59, [1, 4, 7, 10]),
+    ('5/20', 0, 59, [5, 25, 45]),
+    ('1,3,5', 0, 6, [1, 3, 5]),
+    ('mon', 0, 6, None),
+    ('5-2', 0, 59, None),
+    ('*/0', 0, 59, None),
+    ('60', 0, 59, None),
+])
+def test_parse_field(field, lo, hi, expected):
+    assert parse_field(field, lo, hi) == expected
+
+
+@pytest.mark.parametrize('values, lo, hi, expected', [
+    (range(24), 0, 23, '*'),
+    ([0, 15, 30, 45], 0, 59, '*/15'),
+    ([2, 6, 10], 0, 23, '2-10/4'),
+    ([1, 2, 3, 7], 0, 59, '1-3,7'),
+    ([4, 5], 0, 23, '4,5'),
+])
+def test_render_field(values, lo, hi, expected):
+    assert render_field(values, lo, hi) == expected
+
+
+@pytest.mark.parametrize('expr, offset, expected', [
+    # No offset or nothing to shift
+    ('0 5 * * *', 0, '0 5 * * *'),
+    ('*/5 * * * *', -240, '*/5 * * * *'),
+    # Same day
+    ('0 5 * * *', -240, '0 1 * * *'),
+    ('15 9-17 * * *', -240, '15 5-13 * * *'),
+    ('0 5 * * *', 60, '0 6 * * *'),
+    # Half-hour zones move the minute field
+    ('0 9 * * *', 330, '30 14 * * *'),
+    # Steps
+    ('0 */2 * * *', -240, '0 */2 * * *'),
+    ('0 */2 * * *', -300, '0 1-23/2 * * *'),
+    # Day of week moves with the day, 7 being Sunday
+    ('30 2 * * 1', -300, '30 21 * * 0'),
+    ('0 2 * * 1-5', -300, '0 21 * * 0-4'),
+    ('0 1 * * 0', -300, '0 20 * * 6'),
+    ('0 1 * * 7', -300, '0 20 * * 6'),
+    ('0 23 * * 6', 120, '0 1 * * 0'),
+    # Day of month moves with the day
+    ('0 3 10 * *', -240, '0 23 9 * *'),
+])
+def test_translate_shifts(expr, offset, expected):
+    assert _translate(expr, offset) == expected
+
+
+@pytest.mark.parametrize('expr, offset', [
+    # Would cross into another month
+    ('0 1 1 * *', -300),
+    ('0 22 31 * *', 120),
+    # Some times change day and others don't
+    ('0 0,12 * * 1', -300),
+    ('0 0,12 1 * *', -300),
+    # Names aren't parsed
+    ('0 2 * * mon', -300),
+    # Not a five-field expression
+    ('@daily', -300),
+])
+def test_translate_leaves_unshiftable(expr, offset):
+    assert _translate(expr, offset) == expr
+
+
+def test_offset_follows_dst():
+    winter = datetime(2026, 1, 15)
+    summer = datetime(2026, 7, 15)
+
+    assert offset_minutes('UTC', 'America/New_York', winter) == -300
+    assert offset_minutes('UTC', 'America/New_York', summer) == -240
+    assert offset_minutes('UTC', 'Asia/Kolkata', winter) == 330
+
+    assert translate('0 5 * * *', 'UTC', 'America/New_York', winter) == '0 0 * * *'
+    assert translate('0 5 * * *', 'UTC', 'America/New_York', summer) == '0 1 * * *'
+
+
+def test_translate_normalizes_whitespace():
+    assert translate('0  5 * *  * ', 'UTC', 'UTC') == '0 5 * * *'
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytest
+from crontab import CronTab
+
+from sprucepy import linscheduler
+
+
+@pytest.fixture
+def crontab(monkeypatch, tmp_path):
+    tabfile = tmp_path / 'crontab'
+
+    def write(text):
+        tabfile.write_text(text)
+        linscheduler.invalidate_crontab()
+
+    monkeypatch.setattr(linscheduler, 'CronTab', lambda user=None: CronTab(tabfile=str(tabfile)))
+    yield write
+    linscheduler.invalidate_crontab()
+
+
+def test_project_runs_skips_reboot_and_never_firing_jobs(crontab):
+    crontab(
+        '@reboot echo reboot # Reboot\n'
+        '0 0 31 2 * echo never # Never\n'
+        '0 */6 * * * echo often # Often\n'
+    )
+
+    projection = linscheduler.project_runs(datetime(2026, 10, 17), datetime(2026, 10, 18))
+
+    assert projection['task'] == ['Often'] * 4
+    assert [t.hour for t in projection['time']] == [6, 12, 18, 0]
@@ -0,0 +1,27 @@
+import sys
+import subprocess
+
+from sprucepy import runner
+from sprucepy.runner import Runner, CPU_LIMIT_CODE
+
+
+def test_cpu_rlimit_is_reported_as_cpu_limit(monkeypatch, tmp_path):
+    # Poll too slowly for the tree-wide check, so the rlimit ends the run
+    monkeypatch.setattr(runner, 'LIMIT_POLL', 30)
+
+    r = Runner(target='-c "while True: pass"', start_dir=str(tmp_path), max_cpu=1)
+    command = r._command(sys.executable, r.target)
+
+    assert 'ulimit -S -t 2' in command
+
+    proc = subprocess.Popen(command, shell=True)
+    exceeded = r._wait(proc)
+
+    assert exceeded is not None
+    assert exceeded[0] == CPU_LIMIT_CODE
+
+
+def test_no_rlimit_without_max_cpu(tmp_path):
+    r = Runner(target='script.py', start_dir=str(tmp_path))
+
+    assert 'ulimit' not in r._command(sys.executable, r.target)